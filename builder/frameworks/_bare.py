@@ -65,5 +65,9 @@ if "BOARD" in env:
         ]
     )
 
+env.ApplyOptimizationProfile()
+env.ApplyRamFunctions()
+env.ApplyFlashLayout()
+
 # copy CCFLAGS to ASFLAGS (-x assembler-with-cpp mode)
 env.Append(ASFLAGS=env.get("CCFLAGS", [])[:])
@@ -15,6 +15,8 @@
 """
 W60X SDK
 """
+import sys
+import time
 from os.path import isfile, isdir, join
 
 from SCons.Script import DefaultEnvironment
@@ -156,6 +158,13 @@ env.Append(
 # ignore board buildscript, this arduino core knows only one linker script
 env.Replace(LDSCRIPT_PATH=join(FRAMEWORK_DIR, "tools", "sdk", "ld", "link_w600.ld"))
 
+# link for the flash layout, the wm_tool image addresses are taken from it
+if not env.ApplyFlashLayout() and board.get("build.flash_layout", ""):
+    sys.stderr.write(
+        "Error: board_build.flash_layout is not supported by the linker "
+        "script of this Arduino core\n")
+    env.Exit(1)
+
 #
 # Process configuration flags
 #
@@ -164,9 +173,16 @@ cpp_defines = env.Flatten(env.get("CPPDEFINES", []))
 
 process_standard_library_configuration(cpp_defines)
 
+env.ApplyOptimizationProfile()
+
 # copy CCFLAGS to ASFLAGS (-x assembler-with-cpp mode)
 env.Append(ASFLAGS=env.get("CCFLAGS", [])[:])
 
+if env.IsLTOEnabled():
+    env.EnableLTO()
+
+env.ApplyPGOFlags()
+
 env.Append(
     LIBSOURCE_DIRS=[
         join(FRAMEWORK_DIR, "libraries")
@@ -179,14 +195,37 @@ env.Append(
 
 libs = []
 
+# the prebuilt SDK archives linked with "--whole-archive" are regular
+# objects, the linker plugin resolves them together with the LTO objects.
+# Groups listed in "board_build.lto_exclude" are compiled without LTO.
+lto_excludes = env.GetLTOExcludes()
+
+
+def group_env(name):
+    if env.IsLTOEnabled() and name in lto_excludes:
+        return env.DisableLTO()
+    return env
+
 # build core
-env.BuildSources(
+start = time.time()
+group_env("FrameworkArduino").BuildSources(
     join("$BUILD_DIR", "FrameworkArduino"),
     join(FRAMEWORK_DIR, "cores", "w600"))
+env.AddProfileEvent(
+    "FrameworkArduino", "sconscript", start, time.time(),
+    group="FrameworkArduino")
 
 # build variant folder 
 if "build.variant" in env.BoardConfig():
+    start = time.time()
     env.Append(CPPPATH=[variant_dir])
-    env.BuildSources(join("$BUILD_DIR", "FrameworkArduinoVariant"), variant_dir)
+    group_env("FrameworkArduinoVariant").BuildSources(
+        join("$BUILD_DIR", "FrameworkArduinoVariant"), variant_dir)
+    env.AddProfileEvent(
+        "FrameworkArduinoVariant", "sconscript", start, time.time(),
+        group="FrameworkArduinoVariant")
+
+env.BuildBenchmarkHarness()
+env.BuildDeferredLog()
 
 env.Prepend(LIBS=libs)
@@ -15,14 +15,21 @@
 """
 W60X SDK
 """
-from os.path import isfile, isdir, join
+import re
+import sys
+import time
+from os.path import basename, isfile, isdir, join, sep
 
-from SCons.Script import DefaultEnvironment
+from SCons.Script import DefaultEnvironment, Return
 
 env = DefaultEnvironment()
 platform = env.PioPlatform()
 board = env.BoardConfig()
 
+if board.get("build.sdk_variant", "") == "native":
+    env.SConscript("wm60x_sdk_native.py")
+    Return()
+
 FRAMEWORK_DIR = platform.get_package_dir("framework-wm60x-sdk")
 assert isdir(FRAMEWORK_DIR)
 
@@ -195,6 +202,8 @@ if not board.get("build.ldscript", ""):
     print("Warning! Cannot find linker script for the current target!\n")
     env.Replace(LDSCRIPT_PATH=join("ldscripts", "ldscript.ld"))
 
+env.ApplyFlashLayout()
+
 #
 # Process configuration flags
 #
@@ -203,21 +212,139 @@ cpp_defines = env.Flatten(env.get("CPPDEFINES", []))
 
 process_standard_library_configuration(cpp_defines)
 
+env.ApplyOptimizationProfile()
+env.ApplyRamFunctions()
+
 # copy CCFLAGS to ASFLAGS (-x assembler-with-cpp mode)
 env.Append(ASFLAGS=env.get("CCFLAGS", [])[:])
 
+if env.IsLTOEnabled():
+    env.EnableLTO()
+
+env.ApplyPGOFlags()
+
 env.Append(
     LIBSOURCE_DIRS=[
         join(FRAMEWORK_DIR, "libraries")
     ]
 )
 
+#
+# Resolve the SDK components selected by "board_build.sdk_components"
+#
+
+# "src" are the folders below Src/App which belong to a component,
+# "deps" are the components it needs. "rtos" and "lwip" are the
+# Src/OS/RTOS and Src/Network groups.
+SDK_COMPONENTS = {
+    "platform": dict(src=[], deps=["rtos", "lwip"]),
+    "rtos": dict(src=[], deps=[]),
+    "lwip": dict(src=[], deps=["rtos"]),
+    "ajtcl": dict(src=["ajtcl-15.04.00a"], deps=["lwip"]),
+    "atcmd": dict(src=["wm_atcmd"], deps=["lwip", "ping", "httpclient"]),
+    "cjson": dict(src=["cJSON"], deps=[]),
+    "cloud": dict(src=["cloud"], deps=["lwip", "cjson"]),
+    "dhcpserver": dict(src=["dhcpserver"], deps=["lwip"]),
+    "dnsserver": dict(src=["dnsserver"], deps=["lwip"]),
+    "easylogger": dict(src=["easylogger"], deps=["rtos"]),
+    "gmediarender": dict(src=["gmediarender-0.0.6"], deps=["upnp"]),
+    "httpclient": dict(src=["httpclient"], deps=["lwip"]),
+    "iperf": dict(src=["iperf"], deps=["lwip"]),
+    "libcoap": dict(src=["libcoap"], deps=["lwip"]),
+    "libwebsockets": dict(src=["libwebsockets-2.1-stable"], deps=["lwip", "matrixssl"]),
+    "lwm2m": dict(src=["lwm2m-wakaama"], deps=["lwip"]),
+    "matrixssl": dict(src=["matrixssl"], deps=["lwip"]),
+    "mdns": dict(src=["mDNS"], deps=["lwip"]),
+    "mqtt": dict(src=["mqtt"], deps=["lwip"]),
+    "oneshotconfig": dict(src=["oneshotconfig"], deps=["lwip", "dhcpserver"]),
+    "ota": dict(src=["OTA"], deps=["httpclient"]),
+    "ping": dict(src=["ping"], deps=["lwip"]),
+    "polarssl": dict(src=["polarssl"], deps=[]),
+    "upnp": dict(src=["libupnp-1.6.19"], deps=["lwip"]),
+    "web": dict(src=["web"], deps=["lwip", "dhcpserver", "dnsserver"])
+}
+
+
+def resolve_sdk_components(names):
+    unknown = [n for n in names if n not in SDK_COMPONENTS]
+    if unknown:
+        sys.stderr.write(
+            "Error: Unknown SDK component(s) %s. Available: %s\n" % (
+                ", ".join(unknown), ", ".join(sorted(SDK_COMPONENTS))))
+        env.Exit(1)
+    resolved = set()
+    pending = ["platform"] + list(names)
+    while pending:
+        name = pending.pop()
+        if name in resolved:
+            continue
+        resolved.add(name)
+        pending.extend(SDK_COMPONENTS[name]["deps"])
+    return resolved
+
+
+requested_components = [
+    c for c in re.split(r"[\s,]+", board.get("build.sdk_components", "")) if c]
+if requested_components:
+    sdk_components = resolve_sdk_components(requested_components)
+else:
+    sdk_components = set(SDK_COMPONENTS)
+
+app_dirs = sorted(
+    d for name in sdk_components for d in SDK_COMPONENTS[name]["src"])
+unused_app_dirs = [
+    join(FRAMEWORK_DIR, "Src", "App", d)
+    for name in set(SDK_COMPONENTS) - sdk_components
+    for d in SDK_COMPONENTS[name]["src"]
+]
+# drop include paths of components which are not built
+env.Replace(
+    CPPPATH=[
+        p for p in env.get("CPPPATH", [])
+        if not any(p == d or p.startswith(d + sep) for d in unused_app_dirs)
+    ]
+)
+
+# these add CPPDEFINES/CPPPATH, which must be set before the SDK groups
+# clone the environment
+
+# patch applier for "ota-delta" updates
+if "ota" in sdk_components:
+    env.BuildOTADeltaModule()
+
+env.BuildBenchmarkHarness()
+env.BuildDeferredLog()
+
 #
 # Target: Build Core Library
 #
 
 libs = []
 
+# the startup code and the FreeRTOS port rely on naked functions and
+# handlers only referenced from assembly, which LTO drops or breaks
+lto_excludes = env.GetLTOExcludes(["sdkplatform", "sdkrtos"])
+
+
+def build_sdk_group(name, variant_dir, src_dir, src_filter):
+    start = time.time()
+    group_env = env
+    if env.IsLTOEnabled() and name in lto_excludes:
+        group_env = env.DisableLTO()
+    if board.get("build.sdk_cpppath_pruning", "no") in ("yes", "true", "1"):
+        group_env = group_env.Clone()
+        group_env.Replace(CPPPATH=env.PruneCPPPATH(src_dir, src_filter))
+    if env.IsPCHEnabled():
+        if group_env is env:
+            group_env = env.Clone()
+        group_env.UsePrecompiledHeader(name, src_dir, src_filter)
+    libs.append(group_env.BuildSDKArchive(
+        name, variant_dir, src_dir, src_filter=src_filter))
+    env.AddProfileEvent(
+        name, "sconscript", start, time.time(),
+        group=basename(variant_dir))
+
+
 platform_exclude_dirs = [
     # not-built source files in crypto stuff
     "Common/crypto/digest/md5Matrix.c",
@@ -238,16 +365,19 @@ platform_exclude_dirs = [
 platform_exclude_dirs_src_filter = " ".join(["-<" + d + ">" for d in platform_exclude_dirs])
 
 # build startup files
-env.BuildSources(
+build_sdk_group(
+    "sdkplatform",
     join("$BUILD_DIR", "SDKPlatformBoot"),
     join(FRAMEWORK_DIR, "Platform"),
-    src_filter="+<*> " + platform_exclude_dirs_src_filter)
+    "+<*> " + platform_exclude_dirs_src_filter)
 
 # build RTOS
-env.BuildSources(
-    join("$BUILD_DIR", "SDKRTOS"),
-    join(FRAMEWORK_DIR, "Src", "OS", "RTOS"),
-    src_filter="+<*> -<ports/port_m3.c> -<wm_rtos.c>") #exclude port file meant for other compiler
+if "rtos" in sdk_components:
+    build_sdk_group(
+        "sdkrtos",
+        join("$BUILD_DIR", "SDKRTOS"),
+        join(FRAMEWORK_DIR, "Src", "OS", "RTOS"),
+        "+<*> -<ports/port_m3.c> -<wm_rtos.c>") #exclude port file meant for other compiler
 
 network_exclude_dirs = [
     "lwip2.0.3.c",
@@ -260,10 +390,12 @@ network_exclude_dirs = [
 ]
 network_exclude_dirs_src_filter = " ".join(["-<" + d + ">" for d in network_exclude_dirs])
 
-env.BuildSources(
-    join("$BUILD_DIR", "SDKNetwork"),
-    join(FRAMEWORK_DIR, "Src", "Network"),
-    src_filter="+<*> " + network_exclude_dirs_src_filter)
+if "lwip" in sdk_components:
+    build_sdk_group(
+        "sdknetwork",
+        join("$BUILD_DIR", "SDKNetwork"),
+        join(FRAMEWORK_DIR, "Src", "Network"),
+        "+<*> " + network_exclude_dirs_src_filter)
 
 # Built needed App folders
 
@@ -317,10 +449,28 @@ app_exclude_dirs = [
 ]
 app_exclude_dirs_src_filter = " ".join(["-<" + d + ">" for d in app_exclude_dirs])
 
-env.BuildSources(
-    join("$BUILD_DIR", "SDKApps"),
-    join(FRAMEWORK_DIR, "Src", "App"),
-    src_filter="+<*> " + app_exclude_dirs_src_filter) 
-    
-
-#env.Prepend(LIBS=libs)
+if requested_components:
+    # only the folders of the selected components
+    app_src_filter = "-<*> " + " ".join(["+<" + d + "/>" for d in app_dirs])
+else:
+    app_src_filter = "+<*>"
+
+if app_dirs:
+    build_sdk_group(
+        "sdkapps",
+        join("$BUILD_DIR", "SDKApps"),
+        join(FRAMEWORK_DIR, "Src", "App"),
+        app_src_filter + " " + app_exclude_dirs_src_filter)
+
+# the SDK archives contain the startup code and objects which are only
+# referenced from the prebuilt wlan library, link every member like the
+# former object files (same "--whole-archive" way as the Arduino core)
+env.Append(
+    LINKFLAGS=[
+        "-Wl,--whole-archive," +
+        ",".join(lib.get_abspath() for lib in libs) +
+        ",--no-whole-archive"
+    ]
+)
+# the archives are created and added as dependencies of the program by
+# ResolveSDKArchives, see tools/sdkcache.py
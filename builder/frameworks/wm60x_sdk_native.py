@@ -0,0 +1,160 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+W60X SDK, host variant ("board_build.sdk_variant = native")
+
+Builds the hardware independent parts of the SDK with the host compiler so
+that they can be unit tested, fuzzed and benchmarked without a board. The
+drivers and OS services they use are replaced by runtime/native.
+"""
+import re
+import sys
+import time
+from os.path import isdir, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+FRAMEWORK_DIR = platform.get_package_dir("framework-wm60x-sdk")
+assert isdir(FRAMEWORK_DIR)
+
+NATIVE_DIR = join(platform.get_dir(), "runtime", "native")
+
+# "src" are (source dir, src_filter) pairs relative to FRAMEWORK_DIR,
+# "deps" are the components it needs
+NATIVE_COMPONENTS = {
+    "cjson": dict(
+        src=[(join("Src", "App", "cJSON"), "+<*>")],
+        deps=[]),
+    "crypto": dict(
+        src=[(join("Platform", "Common", "crypto"),
+              "+<digest/> +<symmetric/> -<digest/md5Matrix.c> "
+              "-<digest/sha1Matrix.c> -<digest/sha256Matrix.c> "
+              "-<symmetric/aesMatrix.c> -<symmetric/arc4.c>")],
+        deps=[]),
+    "lwip": dict(
+        src=[(join("Src", "Network", "lwip2.0.3"),
+              "+<core/> -<core/timers.c> -<core/ipv4/ip_frag.c> "
+              "+<netif/ethernet.c>")],
+        deps=[]),
+    "mqtt": dict(
+        src=[(join("Src", "App", "mqtt"), "+<*>")],
+        deps=["lwip"]),
+    "libcoap": dict(
+        src=[(join("Src", "App", "libcoap"), "+<*> -<coap_io.c>")],
+        deps=["lwip"])
+}
+
+
+def resolve_native_components(names):
+    unknown = [n for n in names if n not in NATIVE_COMPONENTS]
+    if unknown:
+        sys.stderr.write(
+            "Error: SDK component(s) %s are not available for the native "
+            "variant. Available: %s\n" % (
+                ", ".join(unknown), ", ".join(sorted(NATIVE_COMPONENTS))))
+        env.Exit(1)
+    resolved = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in resolved:
+            continue
+        resolved.add(name)
+        pending.extend(NATIVE_COMPONENTS[name]["deps"])
+    return resolved
+
+
+env.Append(
+    CFLAGS=[
+        "-std=gnu11"
+    ],
+
+    CXXFLAGS=[
+        "-std=gnu++14"
+    ],
+
+    CCFLAGS=[
+        "-O2",
+        "-g",
+        "-Wall",
+        "-ffunction-sections",
+        "-fdata-sections"
+    ],
+
+    CPPDEFINES=[
+        ("GCC_COMPILE", 1),
+        ("W60X_NATIVE", 1)
+    ],
+
+    CPPPATH=[
+        # must come first, it shadows lwipopts.h and arch/cc.h of the SDK
+        join(NATIVE_DIR, "include"),
+        join(FRAMEWORK_DIR, "Include"),
+        join(FRAMEWORK_DIR, "Include", "App"),
+        join(FRAMEWORK_DIR, "Include", "Net"),
+        join(FRAMEWORK_DIR, "Include", "OS"),
+        join(FRAMEWORK_DIR, "Include", "Platform"),
+        join(FRAMEWORK_DIR, "Platform", "Inc"),
+        join(FRAMEWORK_DIR, "Platform", "Common", "crypto"),
+        join(FRAMEWORK_DIR, "Platform", "Common", "crypto", "symmetric"),
+        join(FRAMEWORK_DIR, "Platform", "Common", "crypto", "digest"),
+        join(FRAMEWORK_DIR, "Platform", "Common", "crypto", "math"),
+        join(FRAMEWORK_DIR, "Src", "Network", "lwip2.0.3", "include"),
+        join(FRAMEWORK_DIR, "Src", "Network", "lwip2.0.3", "include", "lwip"),
+        join(FRAMEWORK_DIR, "Src", "Network", "lwip2.0.3", "include", "netif"),
+        join(FRAMEWORK_DIR, "Src", "App", "cJSON"),
+        join(FRAMEWORK_DIR, "Src", "App", "mqtt"),
+        join(FRAMEWORK_DIR, "Src", "App", "libcoap", "include")
+    ],
+
+    LINKFLAGS=[
+        "-Wl,--gc-sections"
+    ],
+
+    LIBS=["m"]
+)
+
+# the firmware linker script does not apply to host programs
+env.Replace(LDSCRIPT_PATH="")
+
+env.ApplyOptimizationProfile()
+
+#
+# Target: Build the portable SDK layers
+#
+
+requested_components = [
+    c for c in re.split(r"[\s,]+", board.get("build.sdk_components", "")) if c]
+if requested_components:
+    native_components = resolve_native_components(requested_components)
+else:
+    native_components = set(NATIVE_COMPONENTS)
+
+for name in sorted(native_components):
+    for src_dir, src_filter in NATIVE_COMPONENTS[name]["src"]:
+        start = time.time()
+        env.BuildSources(
+            join("$BUILD_DIR", "Native%s" % name.capitalize()),
+            join(FRAMEWORK_DIR, src_dir),
+            src_filter)
+        env.AddProfileEvent(
+            name, "sconscript", start, time.time(),
+            group="Native%s" % name.capitalize())
+
+env.BuildSources(join("$BUILD_DIR", "NativeStubs"), NATIVE_DIR, "+<*.c>")
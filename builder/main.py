@@ -13,24 +13,29 @@
 # limitations under the License.
 
 import sys
+import time
 from platform import system
 from os import makedirs
 from os.path import basename, isdir, join, isfile
 
 from SCons.Script import (ARGUMENTS, COMMAND_LINE_TARGETS, AlwaysBuild,
-                          Builder, Default, DefaultEnvironment)
+                          Builder, Default, DefaultEnvironment, Mkdir,
+                          Return)
 
 
 env = DefaultEnvironment()
 platform = env.PioPlatform()
 board = env.BoardConfig()
 
+sconscript_start = time.time()
+
 env.Replace(
     AR="arm-none-eabi-ar",
     AS="arm-none-eabi-as",
     CC="arm-none-eabi-gcc",
     CXX="arm-none-eabi-g++",
     GDB="arm-none-eabi-gdb",
+    NM="arm-none-eabi-nm",
     OBJCOPY="arm-none-eabi-objcopy",
     RANLIB="arm-none-eabi-ranlib",
     SIZETOOL="arm-none-eabi-size",
@@ -45,6 +50,22 @@ env.Replace(
     PROGSUFFIX=".elf"
 )
 
+# host build of the portable SDK layers, see frameworks/wm60x_sdk_native.py
+is_native = board.get("build.sdk_variant", "") == "native"
+if is_native:
+    env.Replace(
+        AR="ar",
+        AS="as",
+        CC="gcc",
+        CXX="g++",
+        GDB="gdb",
+        NM="nm",
+        OBJCOPY="objcopy",
+        RANLIB="ranlib",
+        SIZETOOL="size",
+        PROGSUFFIX=".exe" if system() == "Windows" else ""
+    )
+
 # Allow user to override via pre:script
 if env.get("PROGNAME", "program") == "program":
     env.Replace(PROGNAME="firmware")
@@ -84,9 +105,67 @@ env.Append(
     )
 )
 
+env.SConscript("tools/buildprof.py")
+env.SConscript("tools/jobsched.py")
+env.SConscript("tools/objcache.py")
+env.SConscript("tools/sdkcache.py")
+env.SConscript("tools/incscan.py")
+env.SConscript("tools/pch.py")
+env.SConscript("tools/flashlayout.py")
+env.SConscript("tools/wmimage.py")
+env.SConscript("tools/otadelta.py")
+env.SConscript("tools/deltaflash.py")
+env.SConscript("tools/multiupload.py")
+env.SConscript("tools/portcache.py")
+env.SConscript("tools/openocdd.py")
+env.SConscript("tools/uploadspeed.py")
+env.SConscript("tools/sizereport.py")
+env.SConscript("tools/lto.py")
+env.SConscript("tools/optprofile.py")
+env.SConscript("tools/pgo.py")
+env.SConscript("tools/bench.py")
+env.SConscript("tools/dlog.py")
+env.SConscript("tools/buildgraph.py")
+
+#
+# Target: Export the compile database and build graph
+#
+
+if COMMAND_LINE_TARGETS == ["buildgraph"] and env.IsBuildGraphEnabled() \
+        and env.IsBuildGraphCurrent():
+    # nothing the graph depends on changed, skip the framework scripts
+    print("Build graph is up to date")
+    env.PublishCompileCommands()
+    env.Alias("buildgraph", [
+        "$W60X_COMPILE_COMMANDS_PATH", "$W60X_BUILD_GRAPH_PATH"])
+    Return()
+
 if not env.get("PIOFRAMEWORK"):
     env.SConscript("frameworks/_bare.py")
 
+#
+# Target: Build and run the host program (native variant)
+#
+
+if is_native:
+    if env.get("PIOFRAMEWORK") != ["wm60x-sdk"]:
+        sys.stderr.write(
+            "Error: board_build.sdk_variant = native requires "
+            "framework = wm60x-sdk\n")
+        env.Exit(1)
+    target_program = env.BuildProgram()
+    env.Alias("buildprog", target_program, target_program)
+    AlwaysBuild(env.Alias(
+        "exec", target_program,
+        env.VerboseAction("$SOURCE", "Running $SOURCE")))
+    Default([target_program])
+    env.ExportBuildGraph(target_program)
+    env.Alias("buildgraph", [
+        "$W60X_COMPILE_COMMANDS_PATH", "$W60X_BUILD_GRAPH_PATH"])
+    env.AddProfileEvent(
+        "main.py", "sconscript", sconscript_start, time.time())
+    Return()
+
 #
 # Target: Build executable and linkable firmware
 #
@@ -98,6 +177,10 @@ if "nobuild" in COMMAND_LINE_TARGETS:
     target_firm = join("$BUILD_DIR", "${PROGNAME}.bin")
 else:
     target_elf = env.BuildProgram()
+    env.ResolveSDKArchives()
+    if env.IsDeferredLogEnabled():
+        env.AddPostAction(target_elf, env.VerboseAction(
+            env.RecordDeferredLogProgram, "Recording $TARGET for w60x_dlog"))
     target_firm = env.ElfToBin(join("$BUILD_DIR", "${PROGNAME}"), target_elf)
 
 AlwaysBuild(env.Alias("nobuild", target_firm))
@@ -111,33 +194,29 @@ if path_wm_tool == "":
     print("ERROR: Failed to find W60x tools!")
     sys.exit(-1)
 
-# for 1MB target
-#IMGTYPE=1M
-#UPDADDR=90000
-#RUNADDR=10100
-# for 2MB target
-#IMGTYPE=2M
-#UPDADDR=100000
-#RUNADDR=10100
-
-# detect from the linker script wehter we have a 1MB or 2MB linker script
-is_1mb_version = "1mb.ld" in board.get("build.ldscript", "link_w600_1m.ld")
+# image type and addresses follow the flash layout, see tools/flashlayout.py
+flash_layout = env.GetFlashLayout()
 
 env.Replace(
+    WM_IMAGE_SECBOOT=join(path_wm_tool, "secboot.img"), # is in same folder as tool
+    WM_IMAGE_TYPE=flash_layout["image_type"],
+    WM_IMAGE_UPD_ADDR="%x" % env.GetFlashPartition("ota")["offset"],
+    WM_IMAGE_RUN_ADDR="%x" % (env.GetFlashPartition("app")["offset"] + 0x100),
+    W60X_APP_FLASH_ADDR="0x%x" % env.GetFlashPartition("app")["address"],
     WM_IMAGE_TOOL= join(path_wm_tool, "wm_tool"),
     WM_IMAGE_TOOL_FLAGS=[
         "-b", # source binary
         "$SOURCE",
         "-sb", # secboot 
-        join(path_wm_tool, "secboot.img"), # is in same folder as tool
+        "$WM_IMAGE_SECBOOT",
         "-fc",
         "compress",
         "-it", # image type
-        "1M" if is_1mb_version else "2M",
+        "$WM_IMAGE_TYPE",
         "-ua", # upload address
-        "90000" if is_1mb_version else "100000",
+        "$WM_IMAGE_UPD_ADDR",
         "-ra", # run address
-        "10100" if is_1mb_version else "10100",
+        "$WM_IMAGE_RUN_ADDR",
         "-df", # generate debug firmware
         "-o", # output,
         "$BUILD_DIR/wm_w600"
@@ -145,12 +224,33 @@ env.Replace(
     WM_IMAGE_CMD="$WM_IMAGE_TOOL $WM_IMAGE_TOOL_FLAGS"
 )
 
-imaging_action = env.Alias("imaging", target_firm, env.VerboseAction("$WM_IMAGE_CMD", "Creating images from $SOURCE")) 
-# special case for upload: somehow the uploader doesn't trigger the "AlwaysBuild" options.
-# it still needs to know that if it wants the wm_w600.fls file, it needs to execute the imaging command
-env.Depends(join("$BUILD_DIR", "wm_w600.fls"), imaging_action)
-# always build during normal build
-AlwaysBuild(imaging_action)
+# the images are only regenerated when the content of firmware.bin changes
+image_targets = [
+    join("$BUILD_DIR", "wm_w600.fls"),
+    join("$BUILD_DIR", "wm_w600_gz.img"),
+    join("$BUILD_DIR", "wm_w600_dbg.img")
+]
+image_actions = [
+    env.VerboseAction("$WM_IMAGE_CMD", "Creating images from $SOURCE")]
+if board.get("build.image_check", "no") in ("yes", "true", "1"):
+    # compare the native image generator of tools/wmimage.py with wm_tool
+    image_actions.append(env.VerboseAction(
+        env.CheckNativeImages, "Checking native images"))
+target_images = env.Command(image_targets, target_firm, image_actions)
+imaging_action = env.Alias("imaging", target_images)
+
+#
+# Target: Delta OTA updates against a stored release
+#
+
+AlwaysBuild(env.Alias("ota-release", target_firm, env.VerboseAction(
+    env.StoreOTARelease, "Storing release $SOURCE")))
+# the base release is not a node, always diff again
+target_delta = env.Command(
+    join("$BUILD_DIR", "wm_w600_delta.bin"), target_firm,
+    env.VerboseAction(env.BuildOTADelta, "Creating delta update $TARGET"))
+AlwaysBuild(target_delta)
+env.Alias("ota-delta", target_delta)
 
 #
 # Target: Print binary size
@@ -161,6 +261,17 @@ target_size = env.Alias(
     env.VerboseAction("$SIZEPRINTCMD", "Calculating size $SOURCE"))
 AlwaysBuild(target_size)
 
+#
+# Target: Size report per component and section
+#
+
+env.Append(LINKFLAGS=["-Wl,-Map=$BUILD_DIR/${PROGNAME}.map"])
+env.SideEffect(join("$BUILD_DIR", "${PROGNAME}.map"), target_elf)
+
+AlwaysBuild(env.Alias(
+    "sizereport", target_elf,
+    env.VerboseAction(env.SizeReport, "Creating size report for $SOURCE")))
+
 #
 # Target: Upload by default .bin file
 #
@@ -188,7 +299,7 @@ if upload_protocol.startswith("blackmagic"):
     )
     upload_source = target_elf
     upload_actions = [
-        env.VerboseAction(env.AutodetectUploadPort, "Looking for BlackMagic port..."),
+        env.VerboseAction(env.ResolveUploadPort, "Looking for BlackMagic port..."),
         env.VerboseAction("$UPLOADCMD", "Uploading $SOURCE")
     ]
 
@@ -236,11 +347,11 @@ elif upload_protocol == "serial":
             '"%s"' % join(platform.get_package_dir("tool-w60x-download") or "", "wm_tool"),
         UPLOADERFLAGS=[
             "-ds", # download speed
-            "$UPLOAD_SPEED",
+            "$WM_DOWNLOAD_SPEED",
             "-it", # image type
-            "1M" if is_1mb_version else "2M",
+            "$WM_IMAGE_TYPE",
             "-ua", # upload address
-            "90000" if is_1mb_version else "100000",
+            "$WM_IMAGE_UPD_ADDR",
             "-ws",  # work speed (non-download)
             "$UPLOAD_SPEED",
             "-rs", # reset method. "none"/"at"/"rts"
@@ -249,11 +360,33 @@ elif upload_protocol == "serial":
         UPLOADCMD='$UPLOADER -c "${__configure_upload_port(__env__)}" $UPLOADERFLAGS -dl "$SOURCE"'
     )
 
+    def _delta_serial_upload(target, source, env):
+        image = source[0].get_abspath()
+        changed = env.GetChangedFlashSectors(image)
+        # the ROM download protocol of wm_tool can neither read the flash
+        # back nor identify the device, another board may be attached to
+        # the port, so the image is always sent as a whole
+        if changed is not None:
+            print("%d sector(s) changed since the last upload to %s" % (
+                len(changed), env.subst("$UPLOAD_PORT")))
+        env.ForgetFlashManifest(image)
+        result = env.ExecuteSerialUpload(target, source)
+        if not result:
+            env.SaveFlashManifest(image)
+        return result
+
     upload_actions = [
-        env.VerboseAction(env.AutodetectUploadPort, "Looking for upload port..."),
-        env.VerboseAction("$UPLOADCMD", "Uploading $SOURCE")
+        env.VerboseAction(env.ResolveUploadPort, "Looking for upload port..."),
+        env.VerboseAction(_delta_serial_upload, "Uploading $SOURCE")
+        if env.IsDeltaUploadEnabled() else
+        env.VerboseAction(env.AdaptiveSerialUpload, "Uploading $SOURCE")
     ]
 
+    AlwaysBuild(env.Alias("benchmark-upload", upload_source, [
+        env.VerboseAction(env.ResolveUploadPort, "Looking for upload port..."),
+        env.VerboseAction(env.BenchmarkSerialUpload, "Benchmarking upload of $SOURCE")
+    ]))
+
 elif upload_protocol in debug_tools:
     openocd_args = [
         "-d%d" % (2 if int(ARGUMENTS.get("PIOVERBOSE", 0)) else 1)
@@ -261,22 +394,110 @@ elif upload_protocol in debug_tools:
     openocd_args.extend(
         debug_tools.get(upload_protocol).get("server").get("arguments", []))
     openocd_args.extend([
-        "-c" "reset_config none_separate",
-        "-c", "program {$BUILD_DIR/wm_w600_dbg.img} 0x8010000 verify reset; shutdown;"# %
-        #board.get("upload.offset_address", "")
+        "-c" "reset_config none_separate"
     ])
     openocd_args = [
         f.replace("$PACKAGE_DIR",
                   platform.get_package_dir("tool-openocd-w60x") or "")
         for f in openocd_args
     ]
+    verify_mode = board.get("upload.verify", "readback")
+    if verify_mode == "crc":
+        # the flash is checked by the CRC32 stub OpenOCD runs from the
+        # target RAM instead of reading the whole image back over SWD
+        program_commands = [
+            "reset halt",
+            "flash write_image erase {$SOURCE} $W60X_APP_FLASH_ADDR",
+            "verify_image_checksum {$SOURCE} $W60X_APP_FLASH_ADDR",
+            "reset run"
+        ]
+    elif verify_mode == "none":
+        program_commands = ["program {$SOURCE} $W60X_APP_FLASH_ADDR reset"]
+    else:
+        program_commands = ["program {$SOURCE} $W60X_APP_FLASH_ADDR verify reset"]
     env.Replace(
         UPLOADER="openocd",
-        UPLOADERFLAGS=openocd_args,
+        OPENOCD_SERVER_FLAGS=openocd_args,
+        OPENOCD_PROGRAM_COMMANDS=program_commands,
+        UPLOADERFLAGS=openocd_args + [
+            "-c", "init; %s; shutdown;" % "; ".join(program_commands)
+        ],
         UPLOADCMD="$UPLOADER $UPLOADERFLAGS")
 
+    def _flash_matches(env, image, address):
+        # another board may be attached to the probe since the last upload
+        commands = [
+            "init", "reset halt",
+            "verify_image_checksum {%s} 0x%x bin" % (image, address),
+            "reset run", "shutdown"]
+        if env.IsOpenOCDDaemonEnabled():
+            return not env.RunOpenOCDCommands(commands[1:-1])
+        env.Replace(OPENOCD_CHECK_FLAGS=["-c", "; ".join(commands)])
+        return not env.Execute(
+            "$UPLOADER $OPENOCD_SERVER_FLAGS $OPENOCD_CHECK_FLAGS")
+
+    def _delta_openocd_upload(target, source, env):
+        image = source[0].get_abspath()
+        app_address = env.GetFlashPartition("app")["address"]
+        changed = env.GetChangedFlashSectors(image)
+        if changed is not None and not _flash_matches(
+                env, env.GetFlashedImage(image), app_address):
+            print("Flash content differs from the last upload, "
+                  "writing the full image")
+            changed = None
+        if changed == []:
+            print("Firmware is up to date, skipping upload")
+            return 0
+        env.ForgetFlashManifest(image)
+        if changed is None and env.IsOpenOCDDaemonEnabled():
+            result = env.OpenOCDDaemonUpload(target, source, env)
+        elif changed is None:
+            result = env.Execute(
+                env.subst("$UPLOADCMD", target=target, source=source))
+        else:
+            commands = ["init", "reset halt"]
+            with open(image, "rb") as fp:
+                for offset, length in env.GetFlashRanges(changed):
+                    fp.seek(offset)
+                    chunk_path = join(
+                        env.subst("$BUILD_DIR"), "delta_%06x.bin" % offset)
+                    with open(chunk_path, "wb") as chunk:
+                        chunk.write(fp.read(length))
+                    commands.append(
+                        "flash write_image erase {%s} 0x%x bin" % (
+                            chunk_path, app_address + offset))
+                    if verify_mode != "none":
+                        commands.append("%s {%s} 0x%x bin" % (
+                            "verify_image_checksum" if verify_mode == "crc"
+                            else "verify_image",
+                            chunk_path, app_address + offset))
+            commands.extend(["reset run", "shutdown"])
+            print("Writing %d changed sector(s)" % len(changed))
+            if env.IsOpenOCDDaemonEnabled():
+                # the daemon is already initialized and keeps running
+                result = env.RunOpenOCDCommands(commands[1:-1])
+            else:
+                env.Replace(OPENOCD_DELTA_FLAGS=[
+                    "-c", "; ".join(commands)
+                ])
+                result = env.Execute(
+                    "$UPLOADER $OPENOCD_SERVER_FLAGS $OPENOCD_DELTA_FLAGS")
+        if not result:
+            env.SaveFlashManifest(image)
+        return result
+
     upload_source = join("$BUILD_DIR", "wm_w600_dbg.img")
-    upload_actions = [env.VerboseAction("$UPLOADCMD", "Uploading $SOURCE")]
+    if env.IsDeltaUploadEnabled():
+        upload_actions = [
+            env.VerboseAction(_delta_openocd_upload, "Uploading $SOURCE")]
+    elif env.IsOpenOCDDaemonEnabled():
+        upload_actions = [
+            env.VerboseAction(env.OpenOCDDaemonUpload, "Uploading $SOURCE")]
+    else:
+        upload_actions = [env.VerboseAction("$UPLOADCMD", "Uploading $SOURCE")]
+
+    AlwaysBuild(env.Alias("openocd-stop", None, env.VerboseAction(
+        env.StopOpenOCDDaemon, "Stopping OpenOCD daemon")))
 
 # custom upload tool
 elif upload_protocol == "custom":
@@ -285,8 +506,68 @@ elif upload_protocol == "custom":
 else:
     sys.stderr.write("Warning! Unknown upload protocol %s\n" % upload_protocol)
 
+if upload_protocol in ("serial", "custom") or upload_protocol in debug_tools:
+    if env.IsMultiUpload():
+        upload_actions = [
+            env.VerboseAction(env.MultiUpload, "Uploading $SOURCE")
+        ]
+
 AlwaysBuild(env.Alias("upload", upload_source, upload_actions))
 
+#
+# Target: Upload and run the on-target benchmarks
+#
+
+AlwaysBuild(env.Alias("benchmark", upload_source, [
+    env.VerboseAction(env.OpenBenchmarkConsole, "Opening benchmark console")
+] + upload_actions + [
+    env.VerboseAction(env.CollectBenchmarks, "Collecting benchmark results")
+]))
+
+#
+# Target: Profile guided optimization
+#
+
+env.Alias("pgo-instrument", target_images)
+env.Alias("pgo-use", target_images)
+
+pgo_tool = env.subst("$DEBUG_TOOL") or (
+    board.get("debug.default_tools", []) or [upload_protocol])[0]
+if pgo_tool in debug_tools:
+    pgo_openocd_args = [
+        f.replace("$PACKAGE_DIR",
+                  platform.get_package_dir("tool-openocd-w60x") or "")
+        for f in debug_tools.get(pgo_tool).get("server").get("arguments", [])
+    ]
+    env.Replace(
+        PGO_COLLECT_FLAGS=pgo_openocd_args + [
+            "-c", "reset_config none_separate",
+            "-c", "init",
+            "-c", "arm semihosting enable",
+            "-c", "program {$BUILD_DIR/wm_w600_dbg.img} $W60X_APP_FLASH_ADDR verify",
+            "-c", "reset run",
+            # the target writes the .gcda files while OpenOCD waits
+            "-c", "sleep %d" % (int(board.get("debug.pgo_run_time", 30)) * 1000),
+            "-c", "shutdown"
+        ],
+        PGO_COLLECT_CMD="openocd $PGO_COLLECT_FLAGS"
+    )
+    AlwaysBuild(env.Alias(
+        "pgo-collect", join("$BUILD_DIR", "wm_w600_dbg.img"),
+        [Mkdir("$PGO_PROFILE_DIR"),
+         env.VerboseAction(
+             "$PGO_COLLECT_CMD",
+             "Collecting profile data into $PGO_PROFILE_DIR")]))
+
+#
+# Target: Export the compile database and build graph
+#
+
+if "nobuild" not in COMMAND_LINE_TARGETS:
+    env.ExportBuildGraph(target_elf)
+env.Alias("buildgraph", [
+    "$W60X_COMPILE_COMMANDS_PATH", "$W60X_BUILD_GRAPH_PATH"])
+
 #
 # Information about obsolete method of specifying linker scripts
 #
@@ -300,3 +581,5 @@ if any("-Wl,-T" in f for f in env.get("LINKFLAGS", [])):
 #
 
 Default([target_buildprog, imaging_action ,target_size])
+
+env.AddProfileEvent("main.py", "sconscript", sconscript_start, time.time())
@@ -0,0 +1,183 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# On-target benchmarks ("benchmark" target).
+#
+# The harness from runtime/bench is built into the firmware, which is then
+# uploaded. Its "@BENCH" result lines are read from the console UART
+# ("monitor_port", or the upload port of serial uploads). A separate console
+# port is opened before the upload; a port shared with wm_tool is opened
+# after it and the target is reset through RTS. The results are written to
+# $BUILD_DIR/benchmark.json and compared against the baseline
+# ("board_build.benchmark_baseline", default benchmark_baseline.json in the
+# project). A benchmark slower than the baseline by more than
+# "board_build.benchmark_tolerance" percent (default 5) fails the target.
+#
+
+import json
+import re
+import time
+from os.path import isfile, join
+
+from SCons.Script import COMMAND_LINE_TARGETS, DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+BENCH_LINE_RE = re.compile(
+    r"@BENCH name=(\S+) iterations=(\d+) avg=(\d+) min=(\d+) max=(\d+)")
+BENCH_END_RE = re.compile(r"@BENCH-END count=(\d+)")
+
+_console = []
+
+
+def IsBenchmarkEnabled(env):
+    return "benchmark" in COMMAND_LINE_TARGETS or board.get(
+        "build.benchmark", "no") in ("yes", "true", "1")
+
+
+def BuildBenchmarkHarness(env):
+    if not env.IsBenchmarkEnabled():
+        return
+    harness_dir = join(platform.get_dir(), "runtime", "bench")
+    env.Append(
+        CPPDEFINES=["W60X_BENCHMARK"],
+        CPPPATH=[harness_dir]
+    )
+    env.BuildSources(join("$BUILD_DIR", "W60xBench"), harness_dir)
+
+
+def _console_port(env):
+    port = env.subst("$MONITOR_PORT")
+    if not port and env.subst("$UPLOAD_PROTOCOL") == "serial":
+        port = env.subst("$UPLOAD_PORT")
+    return port
+
+
+def _open_console(env, port):
+    import serial  # shipped with PlatformIO
+    return serial.Serial(
+        port, int(env.GetProjectOption("monitor_speed", 115200)), timeout=1)
+
+
+def _reset_target(ser):
+    # the boards reset the W60x through RTS, as "upload.resetmethod = rts"
+    ser.rts = True
+    time.sleep(0.1)
+    ser.rts = False
+
+
+def _read_results(ser, timeout):
+    results = {}
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        line = ser.readline().decode("utf-8", "replace").strip()
+        match = BENCH_LINE_RE.search(line)
+        if match:
+            print(line)
+            results[match.group(1)] = dict(
+                iterations=int(match.group(2)),
+                avg=int(match.group(3)),
+                min=int(match.group(4)),
+                max=int(match.group(5)))
+        elif BENCH_END_RE.search(line):
+            return results
+    print("Warning! Timeout while waiting for the benchmark results")
+    return results
+
+
+def OpenBenchmarkConsole(_, target, source, env):
+    # pylint: disable=unused-argument
+    # opened before the upload, the benchmarks start right after it
+    port = env.subst("$MONITOR_PORT")
+    if env.subst("$UPLOAD_PROTOCOL") == "serial" and (
+            not port or not env.subst("$UPLOAD_PORT")
+            or port == env.subst("$UPLOAD_PORT")):
+        # wm_tool needs the port, CollectBenchmarks opens it after the
+        # upload and resets the target
+        return 0
+    if not port:
+        print("Error: No console port for the benchmark results, "
+              "set \"monitor_port\" in platformio.ini")
+        return 1
+    _console.append(_open_console(env, port))
+    return 0
+
+
+def CollectBenchmarks(_, target, source, env):
+    # pylint: disable=unused-argument
+    f_cpu = int(re.sub(r"\D", "", board.get("build.f_cpu", "80000000L")))
+    port = _console_port(env)
+    if _console:
+        ser = _console.pop()
+    elif port:
+        ser = _open_console(env, port)
+        # the firmware started when the upload finished, before the port
+        # was opened, run it again to get all of its output
+        _reset_target(ser)
+    else:
+        print("Error: No console port for the benchmark results, "
+              "set \"monitor_port\" in platformio.ini")
+        return 1
+    with ser:
+        results = _read_results(
+            ser, int(board.get("build.benchmark_timeout", 60)))
+    if not results:
+        print("Error: No benchmark results received from %s" % ser.port)
+        return 1
+    for item in results.values():
+        item["avg_us"] = round(item["avg"] * 1e6 / f_cpu, 3)
+
+    with open(join(env.subst("$BUILD_DIR"), "benchmark.json"), "w") as fp:
+        json.dump(dict(f_cpu=f_cpu, results=results), fp, indent=2)
+
+    baseline_path = env.subst(board.get(
+        "build.benchmark_baseline",
+        join("$PROJECT_DIR", "benchmark_baseline.json")))
+    if not isfile(baseline_path):
+        with open(baseline_path, "w") as fp:
+            json.dump(dict(f_cpu=f_cpu, results=results), fp, indent=2)
+        print("Stored new benchmark baseline %s" % baseline_path)
+        return 0
+
+    with open(baseline_path) as fp:
+        baseline = json.load(fp).get("results", {})
+    tolerance = float(board.get("build.benchmark_tolerance", 5))
+    regressions = 0
+    print("%-32s %12s %12s %8s" % (
+        "Benchmark", "Baseline", "Current", "Change"))
+    for name, item in sorted(results.items()):
+        if name not in baseline or not baseline[name]["avg"]:
+            print("%-32s %12s %12d %8s" % (name, "-", item["avg"], "new"))
+            continue
+        change = (item["avg"] - baseline[name]["avg"]) * 100.0 / \
+            baseline[name]["avg"]
+        regressed = change > tolerance
+        regressions += int(regressed)
+        print("%-32s %12d %12d %+7.1f%%%s" % (
+            name, baseline[name]["avg"], item["avg"], change,
+            " REGRESSION" if regressed else ""))
+    if regressions:
+        print("Error: %d benchmark(s) regressed by more than %.1f%%" % (
+            regressions, tolerance))
+        return 1
+    return 0
+
+
+env.AddMethod(IsBenchmarkEnabled)
+env.AddMethod(BuildBenchmarkHarness)
+env.AddMethod(OpenBenchmarkConsole)
+env.AddMethod(CollectBenchmarks)
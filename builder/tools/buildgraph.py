@@ -0,0 +1,239 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Compile database and build graph export ("buildgraph" target).
+#
+# After the SConscripts are evaluated, the object nodes reachable from the
+# program (the SDK archives, the Arduino core and variant, src and the
+# libraries) are written to $W60X_COMPILE_COMMANDS_PATH (default
+# $BUILD_DIR/buildgraph/compile_commands.json) and $W60X_BUILD_GRAPH_PATH
+# ($BUILD_DIR/buildgraph.json), which lists the sources and objects of every
+# source group. Both files are tagged with a fingerprint of platformio.ini,
+# the board manifest, the package versions and the project source layout
+# and are only rewritten when it changes. "pio run -t buildgraph" also
+# copies the compile database to $COMPILATIONDB_PATH, unless the "compiledb"
+# target of PlatformIO writes it, and returns right away, without evaluating
+# the frameworks, if the files are up to date.
+#
+# "board_build.build_graph = no" disables the export.
+#
+
+import hashlib
+import json
+import shutil
+from os import environ, makedirs, walk
+from os.path import abspath, dirname, isdir, isfile, join, relpath
+
+from SCons.Node import Node
+from SCons.Script import COMMAND_LINE_TARGETS, DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+env.SetDefault(
+    W60X_COMPILE_COMMANDS_PATH=join(
+        "$BUILD_DIR", "buildgraph", "compile_commands.json"),
+    W60X_BUILD_GRAPH_PATH=join("$BUILD_DIR", "buildgraph.json")
+)
+
+COMMANDS = (
+    ((".c",), "$CCCOM"),
+    ((".cc", ".cpp", ".cxx", ".c++"), "$CXXCOM"),
+    ((".S", ".spp", ".SPP", ".sx"), "$ASPPCOM"),
+    ((".s", ".asm", ".ASM"), "$ASCOM")
+)
+
+_state = {}
+_extra_roots = []
+
+
+def IsBuildGraphEnabled(env):
+    return board.get("build.build_graph", "yes") in ("yes", "true", "1")
+
+
+def _list_files(path):
+    if not path or not isdir(path):
+        return []
+    return sorted(
+        relpath(join(root, name), path)
+        for root, _, files in walk(path) for name in files)
+
+
+def GetBuildGraphFingerprint(env):
+    if "fingerprint" not in _state:
+        config_path = env.subst("$PROJECT_CONFIG")
+        config = ""
+        if isfile(config_path):
+            with open(config_path) as fp:
+                config = fp.read()
+        data = dict(
+            env=env.subst("$PIOENV"),
+            config=config,
+            board=board.manifest,
+            platform=platform.version,
+            packages=dict(
+                (name, platform.get_package_version(name))
+                for name in platform.packages),
+            environ=dict(
+                (k, v) for k, v in environ.items()
+                if k.startswith("PLATFORMIO_")),
+            src=_list_files(env.subst("$PROJECT_SRC_DIR")),
+            lib=_list_files(env.GetProjectConfig().get_optional_dir("lib")),
+            libdeps=_list_files(
+                env.subst(join("$PROJECT_LIBDEPS_DIR", "$PIOENV")))
+        )
+        _state["fingerprint"] = hashlib.sha1(json.dumps(
+            data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return _state["fingerprint"]
+
+
+def IsBuildGraphCurrent(env):
+    if "current" not in _state:
+        current = False
+        graph_path = env.subst("$W60X_BUILD_GRAPH_PATH")
+        if isfile(graph_path) and isfile(
+                env.subst("$W60X_COMPILE_COMMANDS_PATH")):
+            try:
+                with open(graph_path) as fp:
+                    current = json.load(fp).get("fingerprint") == \
+                        env.GetBuildGraphFingerprint()
+            except ValueError:
+                pass
+        _state["current"] = current
+    return _state["current"]
+
+
+def AddBuildGraphGroup(env, variant_dir, src_dir, src_filter=None):
+    """Add a source group which is not part of the build graph, e.g. an
+    SDK group linked from the archive cache, to the export."""
+    if not env.IsBuildGraphEnabled() or env.IsBuildGraphCurrent():
+        return
+    for node in env.CollectBuildFiles(variant_dir, src_dir, src_filter):
+        if not node.has_builder():
+            node = env.Object(node)[0]
+        _extra_roots.append(node)
+
+
+def _command_for(path):
+    for suffixes, command in COMMANDS:
+        if path.endswith(suffixes):
+            return command
+    return None
+
+
+def _collect_objects(roots, obj_suffix):
+    objects = []
+    seen = set()
+    pending = list(roots)
+    while pending:
+        node = pending.pop()
+        if not isinstance(node, Node) or node in seen:
+            continue
+        seen.add(node)
+        if not node.has_builder():
+            continue
+        if str(node).endswith(obj_suffix):
+            objects.append(node)
+            continue
+        pending.extend(node.sources)
+        pending.extend(node.depends)
+    return objects
+
+
+def _group(path, build_dir):
+    if path.startswith(build_dir):
+        return path[len(build_dir):].strip("/\\").replace("\\", "/").split(
+            "/")[0]
+    return None
+
+
+def ExportBuildGraph(env, program):
+    if not env.IsBuildGraphEnabled() or env.IsBuildGraphCurrent():
+        return
+    build_dir = abspath(env.subst("$BUILD_DIR"))
+    project_dir = env.subst("$PROJECT_DIR")
+    roots = env.Flatten([program]) + env.Flatten(env.get("LIBS", [])) + \
+        _extra_roots
+    entries = []
+    groups = {}
+    for obj in _collect_objects(roots, env.subst("$OBJSUFFIX")):
+        source = obj.sources[0]
+        src_path = source.srcnode().get_abspath()
+        command = _command_for(src_path)
+        if not command:
+            continue
+        build_env = obj.get_executor().get_build_env()
+        # drop actions appended to the compile, e.g. the RAM function objcopy
+        command = build_env.subst(
+            command, target=[obj], source=[source]).split(" && ")[0]
+        entries.append(dict(
+            directory=project_dir,
+            command=command,
+            file=src_path,
+            output=obj.get_abspath()))
+        group = groups.setdefault(
+            _group(obj.get_abspath(), build_dir) or "external",
+            dict(sources=[], objects=[]))
+        group["sources"].append(src_path)
+        group["objects"].append(obj.get_abspath())
+
+    entries.sort(key=lambda e: e["file"])
+    for group in groups.values():
+        group["sources"].sort()
+        group["objects"].sort()
+    graph = dict(
+        fingerprint=env.GetBuildGraphFingerprint(),
+        env=env.subst("$PIOENV"),
+        program=env.File(env.Flatten([program])[0]).get_abspath(),
+        frameworks=env.get("PIOFRAMEWORK", []),
+        libs=[
+            lib.get_abspath() if isinstance(lib, Node) else str(lib)
+            for lib in env.Flatten(env.get("LIBS", []))],
+        groups=groups
+    )
+
+    for path, data in ((env.subst("$W60X_COMPILE_COMMANDS_PATH"), entries),
+                       (env.subst("$W60X_BUILD_GRAPH_PATH"), graph)):
+        if not isdir(dirname(path)):
+            makedirs(dirname(path))
+        with open(path, "w") as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+    print("Build graph written to %s" % env.subst("$W60X_BUILD_GRAPH_PATH"))
+    env.PublishCompileCommands()
+
+
+def PublishCompileCommands(env):
+    """Copy the compile database to $COMPILATIONDB_PATH for the "buildgraph"
+    target, other builds leave the file of PlatformIO alone."""
+    if "buildgraph" not in COMMAND_LINE_TARGETS or \
+            "compiledb" in COMMAND_LINE_TARGETS:
+        return
+    source = env.subst("$W60X_COMPILE_COMMANDS_PATH")
+    path = env.subst("$COMPILATIONDB_PATH")
+    if not isfile(source) or abspath(source) == abspath(path):
+        return
+    if not isdir(dirname(path)):
+        makedirs(dirname(path))
+    shutil.copyfile(source, path)
+    print("Compile database written to %s" % path)
+
+
+env.AddMethod(IsBuildGraphEnabled)
+env.AddMethod(GetBuildGraphFingerprint)
+env.AddMethod(IsBuildGraphCurrent)
+env.AddMethod(AddBuildGraphGroup)
+env.AddMethod(ExportBuildGraph)
+env.AddMethod(PublishCompileCommands)
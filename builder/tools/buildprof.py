@@ -0,0 +1,201 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Opt-in build profiling ("board_build.profile = yes").
+#
+# Every command spawned by SCons is timed and attributed to a phase
+# (compile, archive, link, objcopy, imaging) and, for compiles, to its
+# source group below $BUILD_DIR (SDKRTOS, SDKApps, FrameworkArduino, ...).
+# The dependency scanning of C/C++/assembler sources and headers is timed
+# as "scan" phase, per group for the sources of a group. The result is
+# written to $BUILD_DIR/build_profile.json, which can be loaded directly
+# into chrome://tracing or Perfetto.
+#
+
+import atexit
+import json
+import re
+import threading
+import time
+from os import makedirs, sep
+from os.path import abspath, basename, isdir, join
+
+from SCons.Script import DefaultEnvironment
+from SCons.Tool import CScanner
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+_events = []
+_scans = {}
+_scanners = []
+_lock = threading.Lock()
+_start = time.time()
+
+
+def IsBuildProfileEnabled(env):
+    return board.get("build.profile", "no") in ("yes", "true", "1")
+
+
+def AddProfileEvent(env, name, category, start, end, **args):
+    with _lock:
+        _events.append(dict(
+            name=name, cat=category, ph="X", pid=1,
+            tid=threading.current_thread().name,
+            ts=int((start - _start) * 1e6), dur=int((end - start) * 1e6),
+            args=args))
+
+
+def _unquote(arg):
+    # SCons hands the spawn function shell-escaped arguments
+    if len(arg) > 1 and arg[0] == arg[-1] == '"':
+        return re.sub(r'\\(.)', r"\1", arg[1:-1])
+    return arg
+
+
+def _get_output(args):
+    for i, arg in enumerate(args):
+        if arg == "-o" and i + 1 < len(args):
+            return _unquote(args[i + 1])
+        if arg.startswith("-o") and len(arg) > 2:
+            return arg[2:]
+    return None
+
+
+def _classify(args, build_dir):
+    tool = basename(args[0]).lower()
+    output = _get_output(args) or ""
+    if "objcopy" in tool:
+        return "objcopy", None
+    if "wm_tool" in tool:
+        return "imaging", None
+    if re.search(r"(^|-)(gcc-)?(ar|ranlib)(\.exe)?$", tool):
+        return "archive", None
+    if output.endswith(".elf"):
+        return "link", None
+    if "-c" in args:
+        group = None
+        relpath = abspath(output)
+        if relpath.startswith(build_dir + sep):
+            group = relpath[len(build_dir) + 1:].split(sep)[0]
+        return "compile", group
+    return "other", None
+
+
+def _wrap_spawn(spawn, build_dir):
+    def _spawn(sh, escape, cmd, args, spawn_env):
+        start = time.time()
+        try:
+            return spawn(sh, escape, cmd, args, spawn_env)
+        finally:
+            end = time.time()
+            phase, group = _classify(args, build_dir)
+            env.AddProfileEvent(
+                basename(_get_output(args) or args[0]), phase, start, end,
+                group=group)
+    return _spawn
+
+
+def _wrap_scanner(scanner, build_dir):
+    """Time the calls of `scanner` only: its class is swapped for a
+    subclass and restored by `_restore_scanners` at exit."""
+    scanner_class = scanner.__class__
+    scan = scanner_class.__call__
+
+    def _call(self, node, env, path=()):
+        start = time.time()
+        try:
+            return scan(self, node, env, path)
+        finally:
+            duration = time.time() - start
+            group = None
+            node_path = node.get_abspath()
+            if node_path.startswith(build_dir + sep):
+                group = node_path[len(build_dir) + 1:].split(sep)[0]
+            with _lock:
+                item = _scans.setdefault(group, [0, 0.0])
+                item[0] += 1
+                item[1] += duration
+
+    _scanners.append((scanner, scanner_class))
+    scanner.__class__ = type(
+        "Profiled" + scanner_class.__name__, (scanner_class,),
+        dict(__call__=_call))
+
+
+def _restore_scanners():
+    while _scanners:
+        scanner, scanner_class = _scanners.pop()
+        scanner.__class__ = scanner_class
+
+
+def _write_profile():
+    end = time.time()
+    _restore_scanners()
+    phases = {}
+    groups = {}
+    for event in _events:
+        phases[event["cat"]] = phases.get(event["cat"], 0) + event["dur"]
+        group = event["args"].get("group")
+        if group and event["cat"] == "compile":
+            item = groups.setdefault(group, dict(
+                objects=0, cpu_time=0, first=event["ts"], last=0))
+            item["objects"] += 1
+            item["cpu_time"] += event["dur"]
+            item["first"] = min(item["first"], event["ts"])
+            item["last"] = max(item["last"], event["ts"] + event["dur"])
+    if _scans:
+        phases["scan"] = sum(int(v[1] * 1e6) for v in _scans.values())
+
+    summary = dict(
+        total=round(end - _start, 3),
+        phases=dict((k, round(v / 1e6, 3)) for k, v in phases.items()),
+        groups=dict(
+            (k, dict(objects=v["objects"],
+                     cpu_time=round(v["cpu_time"] / 1e6, 3),
+                     wall_time=round((v["last"] - v["first"]) / 1e6, 3),
+                     scan_time=round(_scans.get(k, [0, 0.0])[1], 3)))
+            for k, v in groups.items()),
+        scans=dict(
+            (k or "headers", dict(nodes=v[0], time=round(v[1], 3)))
+            for k, v in _scans.items()),
+        slowest_objects=[
+            dict(name=e["name"], group=e["args"].get("group"),
+                 time=round(e["dur"] / 1e6, 3))
+            for e in sorted(
+                [e for e in _events if e["cat"] == "compile"],
+                key=lambda e: -e["dur"])[:20]
+        ])
+
+    build_dir = env.subst("$BUILD_DIR")
+    if not isdir(build_dir):
+        makedirs(build_dir)
+    with open(join(build_dir, "build_profile.json"), "w") as fp:
+        json.dump(dict(traceEvents=_events, displayTimeUnit="ms",
+                       summary=summary), fp, indent=1)
+    print("Build profile written to %s" % join(
+        build_dir, "build_profile.json"))
+
+
+env.AddMethod(IsBuildProfileEnabled)
+env.AddMethod(AddProfileEvent)
+
+if env.IsBuildProfileEnabled():
+    env.Replace(
+        SPAWN=_wrap_spawn(env["SPAWN"], abspath(env.subst("$BUILD_DIR"))))
+    # SCons scans from the main thread while the jobs run, the C scanner
+    # is shared by the C, C++ and preprocessed assembler sources
+    _wrap_scanner(CScanner, abspath(env.subst("$BUILD_DIR")))
+    atexit.register(_write_profile)
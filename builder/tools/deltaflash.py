@@ -0,0 +1,124 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Differential flashing support.
+#
+# After every successful upload a manifest with one hash per flash sector of
+# the uploaded image, and a copy of the image, is stored per upload port.
+# The next upload to the same port compares the new image against it, so
+# only the changed sectors have to be erased and written. Another board may
+# be attached to the same port or probe since, so the manifest is only
+# trusted after the flash content was checked against the stored image.
+#
+
+import hashlib
+import json
+import re
+import shutil
+from os import makedirs, remove
+from os.path import basename, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+SECTOR_SIZE = 4096
+
+env.SetDefault(
+    W60X_FLASH_MANIFEST_DIR=join("$PROJECT_CORE_DIR", ".cache", "w60x-flash")
+)
+
+
+def _sector_hashes(path):
+    hashes = []
+    with open(path, "rb") as fp:
+        while True:
+            sector = fp.read(SECTOR_SIZE)
+            if not sector:
+                break
+            sector += b"\xff" * (SECTOR_SIZE - len(sector))
+            hashes.append(hashlib.sha1(sector).hexdigest())
+    return hashes
+
+
+def _manifest_path(env, image):
+    device = env.subst("$UPLOAD_PORT") or env.subst("$UPLOAD_PROTOCOL")
+    name = re.sub(r"[^\w.-]+", "_", "%s-%s-%s" % (
+        env.subst("$BOARD"), device, basename(image)))
+    return join(env.subst("$W60X_FLASH_MANIFEST_DIR"), name + ".json")
+
+
+def GetFlashedImage(env, image):
+    """Path of the copy of the image last flashed to the current port."""
+    return _manifest_path(env, image)[:-5] + ".bin"
+
+
+def IsDeltaUploadEnabled(env):
+    return board.get("upload.delta", "no") in ("yes", "true", "1")
+
+
+def GetChangedFlashSectors(env, image):
+    """Return the indexes of the sectors of `image` which differ from the
+    last image flashed to the current port, or None if nothing is known
+    about the content of the device."""
+    manifest = _manifest_path(env, image)
+    if not isfile(manifest) or not isfile(env.GetFlashedImage(image)):
+        return None
+    with open(manifest) as fp:
+        previous = json.load(fp).get("sectors", [])
+    current = _sector_hashes(image)
+    if len(current) != len(previous):
+        # a grown or shrunk image may leave stale sectors behind
+        return None
+    return [i for i, h in enumerate(current) if h != previous[i]]
+
+
+def GetFlashRanges(env, sectors):
+    """Merge sector indexes into (offset, length) byte ranges."""
+    ranges = []
+    for index in sorted(sectors):
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return [(s * SECTOR_SIZE, (e - s) * SECTOR_SIZE) for s, e in ranges]
+
+
+def SaveFlashManifest(env, image):
+    manifest = _manifest_path(env, image)
+    if not isdir(env.subst("$W60X_FLASH_MANIFEST_DIR")):
+        makedirs(env.subst("$W60X_FLASH_MANIFEST_DIR"))
+    with open(manifest, "w") as fp:
+        json.dump(dict(
+            image=basename(image),
+            sector_size=SECTOR_SIZE,
+            sectors=_sector_hashes(image)
+        ), fp, indent=2)
+    shutil.copyfile(image, env.GetFlashedImage(image))
+
+
+def ForgetFlashManifest(env, image):
+    for path in (_manifest_path(env, image), env.GetFlashedImage(image)):
+        if isfile(path):
+            remove(path)
+
+
+env.AddMethod(IsDeltaUploadEnabled)
+env.AddMethod(GetFlashedImage)
+env.AddMethod(GetChangedFlashSectors)
+env.AddMethod(GetFlashRanges)
+env.AddMethod(SaveFlashManifest)
+env.AddMethod(ForgetFlashManifest)
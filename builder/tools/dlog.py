@@ -0,0 +1,59 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Deferred binary logging ("board_build.dlog = yes").
+#
+# Builds runtime/dlog into the firmware. The format strings of W60X_DLOG()
+# only exist in the ELF file, the "w60x_dlog" monitor filter
+# (monitor/filter_dlog.py) decodes the records sent by the device. The path
+# of the linked ELF file, which follows $PROGNAME, is recorded for the filter
+# in $BUILD_DIR/w60x_dlog.json.
+#
+
+import json
+from os.path import join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+
+def IsDeferredLogEnabled(env):
+    return board.get("build.dlog", "no") in ("yes", "true", "1")
+
+
+def BuildDeferredLog(env):
+    if not env.IsDeferredLogEnabled():
+        return
+    dlog_dir = join(platform.get_dir(), "runtime", "dlog")
+    env.Append(
+        CPPDEFINES=["W60X_DLOG_ENABLED"],
+        CPPPATH=[dlog_dir]
+    )
+    env.BuildSources(join("$BUILD_DIR", "W60xDlog"), dlog_dir)
+
+
+def RecordDeferredLogProgram(_, target, source, env):
+    # pylint: disable=unused-argument
+    with open(join(env.subst("$BUILD_DIR"), "w60x_dlog.json"), "w") as fp:
+        json.dump(dict(program=target[0].get_abspath()), fp, indent=2)
+
+
+env.AddMethod(IsDeferredLogEnabled)
+env.AddMethod(BuildDeferredLog)
+env.AddMethod(RecordDeferredLogProgram)
@@ -0,0 +1,216 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Flash layout planner.
+#
+# The flash layout (secboot, application, OTA slot, user partitions and the
+# SDK parameter area) is described once and everything else is derived from
+# it: the MEMORY block of the linker script, the wm_tool image type and
+# update/run addresses and the flash address used by the debug probes.
+#
+#   board_build.flash_size = 1M | 2M
+#       default: 2M for "*_2m.ld" linker scripts, 1M otherwise
+#   board_build.flash_layout = app:0x70000, ota:0x50000, fs:0x30000
+#       partition sizes, placed in this order after the secboot area. "app"
+#       and "ota" are required, the SDK parameter area at the end of the
+#       flash is always kept. Default: the SDK layout of the flash size.
+#
+# Every partition is available as W60X_FLASH_<NAME>_ADDR/_SIZE define and
+# as __w60x_flash_<name>_start/_size linker symbol.
+#
+
+import re
+import sys
+from os import makedirs
+from os.path import basename, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+FLASH_BASE = 0x8000000
+# the run image starts with its header, the code follows it
+IMAGE_HEADER_SIZE = 0x100
+SECTOR_SIZE = 0x1000
+
+FLASH_SIZES = {"1M": 0x100000, "2M": 0x200000}
+SECBOOT_SIZE = 0x10000
+PARAMS_SIZE = 0x10000
+
+# SDK defaults: update address 0x90000 (1M) and 0x100000 (2M)
+DEFAULT_LAYOUTS = {
+    "1M": [("app", 0x80000), ("ota", 0x60000)],
+    "2M": [("app", 0xF0000), ("ota", 0xF0000)]
+}
+
+MEMORY_RE = re.compile(r"^MEMORY\s*\{.*?^\}", re.M | re.S)
+
+_layout = None
+
+
+def _parse_layout(value):
+    if isinstance(value, dict):
+        return [(k, int(str(v), 0)) for k, v in value.items()]
+    if isinstance(value, list):
+        return [(k, int(str(v), 0)) for k, v in value]
+    partitions = []
+    for item in re.split(r"[\s,]+", value.strip()):
+        if not item:
+            continue
+        name, _, size = item.partition(":")
+        partitions.append((name.strip(), int(size, 0)))
+    return partitions
+
+
+def _layout_error(message):
+    sys.stderr.write("Error: Invalid flash layout: %s\n" % message)
+    env.Exit(1)
+
+
+def GetFlashLayout(env):
+    """Return dict(flash_size, image_type, partitions), every partition is
+    dict(name, offset, size, address) with offsets relative to the start
+    of the flash."""
+    global _layout  # pylint: disable=global-statement
+    if _layout:
+        return _layout
+
+    image_type = board.get("build.flash_size", "").upper()
+    if not image_type:
+        image_type = "2M" if re.search(
+            r"_2m\.ld$", board.get("build.ldscript", "")) else "1M"
+    if image_type not in FLASH_SIZES:
+        _layout_error("unsupported flash size %s, use one of %s" % (
+            image_type, ", ".join(sorted(FLASH_SIZES))))
+    flash_size = FLASH_SIZES[image_type]
+
+    description = board.get("build.flash_layout", "")
+    requested = (_parse_layout(description) if description
+                 else DEFAULT_LAYOUTS[image_type])
+    names = [name for name, _ in requested]
+    for name in ("app", "ota"):
+        if name not in names:
+            _layout_error("no \"%s\" partition" % name)
+    for name in names:
+        if not re.match(r"^[a-z][a-z0-9_]*$", name):
+            _layout_error("invalid partition name \"%s\"" % name)
+    if len(set(names)) != len(names) or set(names) & set(
+            ("secboot", "params")):
+        _layout_error("duplicate or reserved partition names in %s" % (
+            ", ".join(names)))
+
+    partitions = [("secboot", SECBOOT_SIZE)] + requested + [
+        ("params", PARAMS_SIZE)]
+    params_offset = flash_size - PARAMS_SIZE
+    offset = 0
+    result = []
+    for name, size in partitions:
+        if name == "params":
+            offset = params_offset
+        if not size or size % SECTOR_SIZE:
+            _layout_error("size of \"%s\" (0x%x) is not a multiple of the "
+                          "0x%x sector size" % (name, size, SECTOR_SIZE))
+        result.append(dict(
+            name=name, offset=offset, size=size, address=FLASH_BASE + offset))
+        offset += size
+        if name != "params" and offset > params_offset:
+            _layout_error("partitions end at 0x%x, only 0x%x are available "
+                          "below the parameter area" % (offset, params_offset))
+
+    _layout = dict(
+        flash_size=flash_size, image_type=image_type, partitions=result)
+    return _layout
+
+
+def GetFlashPartition(env, name):
+    for partition in env.GetFlashLayout()["partitions"]:
+        if partition["name"] == name:
+            return partition
+    return None
+
+
+def _render_memory(env):
+    app = env.GetFlashPartition("app")
+    lines = [
+        "MEMORY",
+        "{",
+        "  FLASH (rx) : ORIGIN = 0x%x, LENGTH = 0x%x" % (
+            app["address"] + IMAGE_HEADER_SIZE,
+            app["size"] - IMAGE_HEADER_SIZE),
+        "  RAM (rwx) : ORIGIN = 0x20000000, LENGTH = 0x%x" % int(
+            board.get("upload.maximum_ram_size")),
+        "}",
+        ""
+    ]
+    for partition in env.GetFlashLayout()["partitions"]:
+        lines.extend([
+            "__w60x_flash_%s_start = 0x%x;" % (
+                partition["name"], partition["address"]),
+            "__w60x_flash_%s_size = 0x%x;" % (
+                partition["name"], partition["size"])
+        ])
+    return "\n".join(lines)
+
+
+def ApplyFlashLayout(env):
+    """Generate the linker script for the flash layout from the board
+    linker script and export the partitions to the sources. Return the
+    generated linker script, None if the linker script has no MEMORY
+    block to replace."""
+    template = None
+    ldscript = env.subst("$LDSCRIPT_PATH")
+    for path in (ldscript,
+                 join(platform.get_dir(), "ldscripts", basename(ldscript))):
+        if path and isfile(path):
+            template = path
+            break
+    if not template:
+        return None
+
+    with open(template) as fp:
+        contents = fp.read()
+    if not MEMORY_RE.search(contents):
+        return None
+    contents = MEMORY_RE.sub(
+        lambda _: _render_memory(env), contents, count=1)
+
+    build_dir = env.subst("$BUILD_DIR")
+    if not isdir(build_dir):
+        makedirs(build_dir)
+    generated = join(build_dir, "flash_layout.ld")
+    previous = None
+    if isfile(generated):
+        with open(generated) as fp:
+            previous = fp.read()
+    # only rewrite on changes, the link depends on the content
+    if previous != contents:
+        with open(generated, "w") as fp:
+            fp.write(contents)
+    env.Replace(LDSCRIPT_PATH=generated)
+    env.Depends(join("$BUILD_DIR", "${PROGNAME}${PROGSUFFIX}"), generated)
+    env.Append(CPPDEFINES=[
+        ("W60X_FLASH_%s_%s" % (p["name"].upper(), k.upper()),
+         "0x%x" % p["address" if k == "addr" else "size"])
+        for p in env.GetFlashLayout()["partitions"] for k in ("addr", "size")
+    ])
+    return generated
+
+
+env.AddMethod(GetFlashLayout)
+env.AddMethod(GetFlashPartition)
+env.AddMethod(ApplyFlashLayout)
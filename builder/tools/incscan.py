@@ -0,0 +1,107 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Per source group include path pruning.
+#
+# The sources of a group are scanned once for "#include" directives, every
+# include is resolved against CPPPATH like the preprocessor does and only
+# the directories which resolve at least one header are kept. The order is
+# preserved, so every header still resolves to the same file. The result is
+# cached in $BUILD_DIR.
+#
+
+import hashlib
+import json
+import re
+from os import makedirs
+from os.path import dirname, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+
+INCLUDE_RE = re.compile(
+    r"^\s*#\s*include(?:_next)?\s*(?:[<\"]([^>\"]+)[>\"]|(\S+))", re.M)
+SCAN_EXTENSIONS = (".c", ".cpp", ".cc", ".S", ".s", ".h", ".hpp")
+
+
+def _read(path):
+    with open(path, "rb") as fp:
+        return fp.read().decode("latin-1")
+
+
+def _scan_used_dirs(sources, cpppath):
+    """Return the indexes of the CPPPATH entries which are needed by
+    `sources`, or None if an include could not be resolved statically."""
+    used = set()
+    seen = set()
+    pending = list(sources)
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for header, macro in INCLUDE_RE.findall(_read(path)):
+            if macro:
+                # computed include, e.g. "#include MBEDTLS_CONFIG_FILE"
+                return None
+            local = join(dirname(path), header)
+            if isfile(local):
+                pending.append(local)
+            for index, inc_dir in enumerate(cpppath):
+                candidate = join(inc_dir, header)
+                if isfile(candidate):
+                    used.add(index)
+                    pending.append(candidate)
+                    break
+    return used
+
+
+def PruneCPPPATH(env, src_dir, src_filter=None):
+    src_dir = env.subst(src_dir)
+    cpppath = [env.subst(p) for p in env.Flatten(env.get("CPPPATH", []))]
+    key = hashlib.sha1(json.dumps(dict(
+        framework=platform.get_package_version("framework-wm60x-sdk"),
+        src_dir=src_dir,
+        src_filter=src_filter or "",
+        cpppath=cpppath
+    ), sort_keys=True).encode("utf-8")).hexdigest()
+
+    db_path = join(env.subst("$BUILD_DIR"), "cpppath.json")
+    db = {}
+    if isfile(db_path):
+        with open(db_path) as fp:
+            db = json.load(fp)
+
+    if key not in db:
+        sources = [
+            join(src_dir, item)
+            for item in env.MatchSourceFiles(src_dir, src_filter)
+            if item.endswith(SCAN_EXTENSIONS)
+        ]
+        used = _scan_used_dirs(sources, cpppath)
+        db[key] = sorted(used) if used is not None else None
+        if not isdir(dirname(db_path)):
+            makedirs(dirname(db_path))
+        with open(db_path, "w") as fp:
+            json.dump(db, fp, indent=2)
+
+    if db[key] is None:
+        return cpppath
+    return [cpppath[i] for i in db[key]]
+
+
+env.AddMethod(PruneCPPPATH)
@@ -0,0 +1,138 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Longest-job-first ordering of compile jobs.
+#
+# The duration of every compile is recorded in $BUILD_DIR/compile_times.json.
+# SCons starts jobs in the order of the children of a node, so the objects
+# of the SDK archives, and the archives themselves, are sorted by their
+# recorded (or, for new files, estimated) compile time: the slow matrixssl
+# and lwIP units start first instead of keeping one core busy at the end.
+#
+# "board_build.jobs" sets the number of parallel jobs ("auto" = CPU count)
+# when the build is not started through "pio run", which passes -j itself.
+#
+
+import atexit
+import json
+import re
+import threading
+import time
+from multiprocessing import cpu_count
+from os import makedirs
+from os.path import abspath, getsize, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment, GetOption, SetOption
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+SOURCE_SUFFIXES = (".c", ".cc", ".cpp", ".cxx", ".c++", ".s", ".sx")
+
+_times = {}
+_recorded = {}
+_lock = threading.Lock()
+
+
+def _times_path(env):
+    return join(env.subst("$BUILD_DIR"), "compile_times.json")
+
+
+def _load_times(env):
+    path = _times_path(env)
+    if isfile(path):
+        try:
+            with open(path) as fp:
+                _times.update(json.load(fp))
+        except ValueError:
+            pass
+
+
+def _save_times():
+    if not _recorded:
+        return
+    _times.update(_recorded)
+    build_dir = env.subst("$BUILD_DIR")
+    if not isdir(build_dir):
+        makedirs(build_dir)
+    with open(_times_path(env), "w") as fp:
+        json.dump(_times, fp, indent=0, sort_keys=True)
+
+
+def _unquote(arg):
+    # SCons hands the spawn function shell-escaped arguments
+    if len(arg) > 1 and arg[0] == arg[-1] == '"':
+        return re.sub(r'\\(.)', r"\1", arg[1:-1])
+    return arg
+
+
+def _wrap_spawn(spawn):
+    def _spawn(sh, escape, cmd, args, spawn_env):
+        start = time.time()
+        result = spawn(sh, escape, cmd, args, spawn_env)
+        if "-c" in args and "-o" in args[:-1]:
+            output = abspath(_unquote(args[args.index("-o") + 1]))
+            with _lock:
+                _recorded[output] = round(time.time() - start, 3)
+        return result
+    return _spawn
+
+
+def _recorded_time(node):
+    # CollectBuildFiles returns sources, their objects are "<source>.o"
+    path = node.get_abspath()
+    for key in (path, path + env.subst("$OBJSUFFIX")):
+        if key in _times:
+            return _times[key]
+    return None
+
+
+def _is_source(node):
+    return not node.sources and node.get_abspath().lower().endswith(
+        SOURCE_SUFFIXES) and isfile(node.srcnode().get_abspath())
+
+
+def _node_time(node, ratio):
+    recorded = _recorded_time(node)
+    if recorded is not None:
+        return recorded
+    if _is_source(node):
+        # not compiled yet, estimate from the size of the source
+        return getsize(node.srcnode().get_abspath()) * ratio
+    return sum(_node_time(s, ratio) for s in node.sources)
+
+
+def SortByCompileTime(env, nodes):
+    """Return the sources or nodes, slowest first. Archives count with the
+    sum of their objects."""
+    nodes = env.Flatten(nodes)
+    known = [(getsize(n.srcnode().get_abspath()), _recorded_time(n))
+             for n in nodes
+             if _is_source(n) and _recorded_time(n) is not None]
+    size = sum(k[0] for k in known)
+    ratio = sum(k[1] for k in known) / size if size else 1e-6
+    return sorted(nodes, key=lambda n: -_node_time(n, ratio))
+
+
+env.AddMethod(SortByCompileTime)
+
+_load_times(env)
+env.Replace(SPAWN=_wrap_spawn(env["SPAWN"]))
+atexit.register(_save_times)
+
+if board.get("build.jobs", "") and GetOption("num_jobs") == 1:
+    jobs = board.get("build.jobs")
+    SetOption("num_jobs", cpu_count() if jobs == "auto" else int(jobs))
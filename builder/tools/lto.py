@@ -0,0 +1,72 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Link-time optimization ("board_build.lto = yes").
+#
+# Archives have to be created by the gcc-ar/gcc-ranlib wrappers, otherwise
+# the archive index misses the symbols of the LTO objects. Source groups
+# which break under LTO are compiled without it by an environment from
+# DisableLTO().
+#
+
+import re
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+
+def IsLTOEnabled(env):
+    return board.get("build.lto", "no") in ("yes", "true", "1")
+
+
+def GetLTOExcludes(env, defaults=None):
+    """Source groups compiled without LTO: `defaults` of the framework plus
+    the ones from "board_build.lto_exclude"."""
+    excludes = set(defaults or [])
+    excludes.update(
+        e for e in re.split(r"[\s,]+", board.get("build.lto_exclude", ""))
+        if e)
+    return excludes
+
+
+def EnableLTO(env):
+    env.Append(
+        CCFLAGS=["-flto"],
+        LINKFLAGS=["-flto", "-fuse-linker-plugin"]
+    )
+    env.Replace(
+        AR="arm-none-eabi-gcc-ar",
+        RANLIB="arm-none-eabi-gcc-ranlib"
+    )
+
+
+def DisableLTO(env):
+    """Return a clone of `env` which compiles without LTO. Objects of it
+    still link fine into an LTO program."""
+    clone = env.Clone()
+    clone.Replace(
+        CCFLAGS=[f for f in clone.get("CCFLAGS", []) if f != "-flto"],
+        ASFLAGS=[f for f in clone.get("ASFLAGS", []) if f != "-flto"]
+    )
+    clone.Append(CCFLAGS=["-fno-lto"])
+    return clone
+
+
+env.AddMethod(IsLTOEnabled)
+env.AddMethod(GetLTOExcludes)
+env.AddMethod(EnableLTO)
+env.AddMethod(DisableLTO)
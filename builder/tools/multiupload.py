@@ -0,0 +1,137 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Parallel upload to several devices.
+#
+# "upload_port" may contain a comma separated list of ports and/or glob
+# patterns (e.g. "/dev/ttyUSB*"). Every device is flashed by its own worker
+# of a bounded pool, the results are written to
+# $BUILD_DIR/upload_summary.json.
+#
+
+import json
+import re
+import subprocess
+import threading
+import time
+from glob import glob
+from os.path import join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+
+def GetUploadPorts(env):
+    ports = []
+    for item in re.split(r"\s*,\s*", env.subst("$UPLOAD_PORT").strip()):
+        if not item:
+            continue
+        if any(c in item for c in "*?["):
+            ports.extend(sorted(glob(item)))
+        else:
+            ports.append(item)
+    return ports
+
+
+def IsMultiUpload(env):
+    value = env.subst("$UPLOAD_PORT")
+    return "," in value or any(c in value for c in "*?[")
+
+
+def _flash_device(cmd, log_path, retries, result):
+    start = time.time()
+    attempts = 0
+    returncode = None
+    with open(log_path, "w") as log:
+        while attempts <= retries:
+            attempts += 1
+            log.write("$ %s\n" % cmd)
+            log.flush()
+            returncode = subprocess.call(
+                cmd, shell=True, stdout=log, stderr=subprocess.STDOUT)
+            if returncode == 0:
+                break
+    result.update(
+        success=returncode == 0,
+        returncode=returncode,
+        attempts=attempts,
+        retries=attempts - 1,
+        duration=round(time.time() - start, 3),
+        log=log_path)
+
+
+def MultiUpload(_, target, source, env):
+    ports = env.GetUploadPorts()
+    if not ports:
+        print("Error: No upload port matches %s" % env.subst("$UPLOAD_PORT"))
+        return 1
+    retries = int(board.get("upload.retries", 1))
+    workers = int(board.get("upload.workers", min(len(ports), 8)))
+    semaphore = threading.BoundedSemaphore(max(1, workers))
+
+    jobs = []
+    for port in ports:
+        overrides = {"UPLOAD_PORT": port}
+        if env.subst("$UPLOADER") == "openocd":
+            # the "port" of a debug probe is its adapter serial number
+            overrides["UPLOADERFLAGS"] = env["UPLOADERFLAGS"][:-2] + [
+                "-c", "adapter serial %s" % port] + env["UPLOADERFLAGS"][-2:]
+        cmd = env.Override(overrides).subst(
+            "$UPLOADCMD", target=target, source=source)
+        log_path = join(env.subst("$BUILD_DIR"), "upload-%s.log" % re.sub(
+            r"[^\w.-]+", "_", port))
+        jobs.append((port, cmd, log_path, {"port": port}))
+
+    def _worker(cmd, log_path, result):
+        with semaphore:
+            _flash_device(cmd, log_path, retries, result)
+
+    print("Uploading to %d device(s) with %d worker(s)" % (
+        len(ports), workers))
+    start = time.time()
+    threads = []
+    for _, cmd, log_path, result in jobs:
+        thread = threading.Thread(
+            target=_worker, args=(cmd, log_path, result))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    results = [job[3] for job in jobs]
+    summary = dict(
+        protocol=env.subst("$UPLOAD_PROTOCOL"),
+        image=source[0].get_abspath(),
+        duration=round(time.time() - start, 3),
+        succeeded=len([r for r in results if r["success"]]),
+        failed=len([r for r in results if not r["success"]]),
+        devices=results)
+    with open(join(env.subst("$BUILD_DIR"), "upload_summary.json"), "w") as fp:
+        json.dump(summary, fp, indent=2)
+
+    for r in results:
+        print("%-24s %-7s %6.1fs  retries: %d" % (
+            r["port"], "OK" if r["success"] else "FAILED", r["duration"],
+            r["retries"]))
+    print("%d of %d device(s) flashed in %.1fs" % (
+        summary["succeeded"], len(results), summary["duration"]))
+    return 1 if summary["failed"] else 0
+
+
+env.AddMethod(GetUploadPorts)
+env.AddMethod(IsMultiUpload)
+env.AddMethod(MultiUpload)
@@ -0,0 +1,216 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Content-hash compiler cache ("board_build.compiler_cache = yes").
+#
+# Every compile is keyed on its preprocessed source, the compiler command
+# line and the compiler actually run: its resolved path, size, modification
+# time and "--version" output, so the ARM toolchain and the host compiler
+# of the native variant never share objects. Objects are stored in a shared
+# directory ("board_build.compiler_cache_dir" or the W60X_COMPILER_CACHE_DIR
+# environment variable, default ~/.platformio/.cache/w60x-objects) which is
+# kept below "board_build.compiler_cache_size" (default 2G) by evicting the
+# least recently used objects. Hits and misses are reported at the end of
+# the build.
+#
+
+import atexit
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+from os.path import abspath, getmtime, getsize, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+_stats = dict(hits=0, misses=0, uncacheable=0)
+_compilers = {}
+_lock = threading.Lock()
+
+
+def IsCompilerCacheEnabled(env):
+    return board.get("build.compiler_cache", "no") in ("yes", "true", "1")
+
+
+def _parse_size(value):
+    match = re.match(
+        r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*$", str(value).upper())
+    if not match:
+        raise ValueError("Invalid compiler cache size %s" % value)
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def _cache_dir(env):
+    return os.environ.get("W60X_COMPILER_CACHE_DIR") or env.subst(
+        board.get("build.compiler_cache_dir",
+                  join("$PROJECT_CORE_DIR", ".cache", "w60x-objects")))
+
+
+def _hash_file(digest, path):
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(65536), b""):
+            digest.update(chunk)
+
+
+def _unquote(arg):
+    # SCons hands the spawn function shell-escaped arguments
+    if len(arg) > 1 and arg[0] == arg[-1] == '"':
+        return re.sub(r'\\(.)', r"\1", arg[1:-1])
+    return arg
+
+
+def _compiler_id(compiler, spawn_env):
+    search_path = (spawn_env or {}).get("PATH", os.environ.get("PATH"))
+    with _lock:
+        if (compiler, search_path) in _compilers:
+            return _compilers[(compiler, search_path)]
+    resolved = shutil.which(compiler, path=search_path) or compiler
+    identity = [resolved]
+    if isfile(resolved):
+        identity.extend([str(getsize(resolved)), str(getmtime(resolved))])
+    try:
+        identity.append(subprocess.check_output(
+            [resolved, "--version"], env=spawn_env,
+            stderr=subprocess.STDOUT).decode("utf-8", "replace"))
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    with _lock:
+        _compilers[(compiler, search_path)] = "\0".join(identity)
+    return _compilers[(compiler, search_path)]
+
+
+def _wrap_spawn(spawn, cache_dir):
+    def _spawn(sh, escape, cmd, args, spawn_env):
+        # the compile itself, RAM function renames follow after "&&"
+        compile_args = args[:args.index("&&")] if "&&" in args else args
+        if "-c" not in compile_args or "-o" not in compile_args[:-1]:
+            return spawn(sh, escape, cmd, args, spawn_env)
+        if any(a.startswith("-fprofile-use") for a in compile_args):
+            # the profile data is an input the key does not cover
+            with _lock:
+                _stats["uncacheable"] += 1
+            return spawn(sh, escape, cmd, args, spawn_env)
+        output = compile_args[compile_args.index("-o") + 1]
+        output_path = _unquote(output)
+
+        preprocessed = "%s.%d.i" % (
+            output_path, threading.current_thread().ident)
+        preprocess_args = [
+            "-E" if a == "-c" else (escape(preprocessed) if a == output else a)
+            for a in compile_args
+        ]
+        if spawn(sh, escape, preprocess_args[0], preprocess_args, spawn_env):
+            # let the real compile report the error
+            with _lock:
+                _stats["uncacheable"] += 1
+            return spawn(sh, escape, cmd, args, spawn_env)
+
+        digest = hashlib.sha1()
+        digest.update(
+            _compiler_id(compile_args[0], spawn_env).encode("utf-8"))
+        digest.update("\0".join(
+            "<output>" if a == output else a for a in args).encode("utf-8"))
+        if any(a.startswith("-g") for a in compile_args):
+            # the compile directory is part of the debug info
+            digest.update(os.getcwd().encode("utf-8"))
+        _hash_file(digest, preprocessed)
+        os.remove(preprocessed)
+        key = digest.hexdigest()
+        cached = join(cache_dir, key[:2], key + ".o")
+
+        if isfile(cached):
+            try:
+                shutil.copyfile(cached, output_path)
+                # the modification time orders the LRU eviction
+                os.utime(cached, None)
+                with _lock:
+                    _stats["hits"] += 1
+                return 0
+            except (IOError, OSError):
+                pass
+
+        result = spawn(sh, escape, cmd, args, spawn_env)
+        with _lock:
+            _stats["misses"] += 1
+        if result == 0 and isfile(output_path):
+            try:
+                if not isdir(join(cache_dir, key[:2])):
+                    os.makedirs(join(cache_dir, key[:2]))
+                tmp = "%s.%d.tmp" % (cached, os.getpid())
+                shutil.copyfile(output_path, tmp)
+                os.rename(tmp, cached)
+            except (IOError, OSError):
+                pass
+        return result
+    return _spawn
+
+
+def _evict(cache_dir, max_size):
+    files = []
+    total = 0
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            path = join(root, name)
+            try:
+                size = getsize(path)
+                files.append((getmtime(path), size, path))
+                total += size
+            except OSError:
+                continue
+    if total <= max_size:
+        return 0
+    removed = 0
+    # shrink below 90% so that not every build has to evict
+    for _, size, path in sorted(files):
+        if total <= max_size * 0.9:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _report(cache_dir, max_size):
+    compiles = _stats["hits"] + _stats["misses"]
+    if not compiles and not _stats["uncacheable"]:
+        return
+    removed = _evict(cache_dir, max_size)
+    print("Compiler cache: %d hits, %d misses (%.0f%% hit rate), "
+          "%d uncacheable%s" % (
+              _stats["hits"], _stats["misses"],
+              100.0 * _stats["hits"] / compiles if compiles else 0,
+              _stats["uncacheable"],
+              ", evicted %d objects" % removed if removed else ""))
+
+
+env.AddMethod(IsCompilerCacheEnabled)
+
+if env.IsCompilerCacheEnabled():
+    compiler_cache_dir = abspath(_cache_dir(env))
+    env.Replace(SPAWN=_wrap_spawn(env["SPAWN"], compiler_cache_dir))
+    atexit.register(
+        _report, compiler_cache_dir,
+        _parse_size(board.get("build.compiler_cache_size", "2G")))
@@ -0,0 +1,190 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Persistent OpenOCD session ("board_upload.openocd_daemon = yes").
+#
+# Instead of starting OpenOCD for every upload, one OpenOCD process per
+# probe configuration is kept running in the background and the flash
+# commands are sent over its Tcl RPC port, so adapter init and target
+# examination are only paid once. The daemon is restarted when its
+# arguments change and is stopped with the "openocd-stop" target.
+#
+
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import time
+from os.path import dirname, isdir, isfile, join
+from platform import system
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+TCL_TERMINATOR = b"\x1a"
+
+env.SetDefault(
+    W60X_OPENOCD_STATE_DIR=join("$PROJECT_CORE_DIR", ".cache", "w60x-openocd")
+)
+
+
+def IsOpenOCDDaemonEnabled(env):
+    return board.get("upload.openocd_daemon", "no") in ("yes", "true", "1")
+
+
+def _get_args(env):
+    return [env.subst(f) for f in env.Flatten(env["OPENOCD_SERVER_FLAGS"])]
+
+
+def _state_path(env):
+    key = hashlib.sha1(json.dumps(_get_args(env)).encode("utf-8")).hexdigest()
+    return join(env.subst("$W60X_OPENOCD_STATE_DIR"), "%s.json" % key[:16])
+
+
+def _free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _send(port, commands, timeout=60):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    try:
+        results = []
+        for command in commands:
+            sock.sendall(command.encode("utf-8") + TCL_TERMINATOR)
+            data = b""
+            while not data.endswith(TCL_TERMINATOR):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise socket.error("OpenOCD closed the connection")
+                data += chunk
+            results.append(data[:-1].decode("utf-8", "replace"))
+        return results
+    finally:
+        sock.close()
+
+
+def _is_alive(port):
+    try:
+        return _send(port, ["version"], timeout=2) is not None
+    except (socket.error, socket.timeout):
+        return False
+
+
+def _start_daemon(env, state_path):
+    port = _free_port()
+    log_path = state_path[:-5] + ".log"
+    args = [env.subst("$UPLOADER")] + _get_args(env) + [
+        "-c", "tcl_port %d" % port,
+        "-c", "telnet_port disabled",
+        "-c", "gdb_port disabled"
+    ]
+    kwargs = {}
+    if system() == "Windows":
+        # DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP
+        kwargs["creationflags"] = 0x00000008 | 0x00000200
+    else:
+        kwargs["preexec_fn"] = os.setsid
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            args, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT,
+            env=env["ENV"], **kwargs)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        if process.poll() is not None:
+            print("Error: OpenOCD exited, see %s" % log_path)
+            return None
+        if _is_alive(port):
+            with open(state_path, "w") as fp:
+                json.dump(dict(pid=process.pid, port=port, args=args), fp)
+            print("Started OpenOCD daemon on Tcl port %d" % port)
+            return port
+        time.sleep(0.2)
+    print("Error: OpenOCD did not open its Tcl port, see %s" % log_path)
+    process.kill()
+    return None
+
+
+def GetOpenOCDDaemonPort(env):
+    """Tcl port of the running daemon, starts one if necessary."""
+    state_path = _state_path(env)
+    if not isdir(dirname(state_path)):
+        os.makedirs(dirname(state_path))
+    if isfile(state_path):
+        with open(state_path) as fp:
+            state = json.load(fp)
+        if _is_alive(state["port"]):
+            return state["port"]
+        os.remove(state_path)
+    return _start_daemon(env, state_path)
+
+
+def RunOpenOCDCommands(env, commands):
+    """Run Tcl commands in the daemon, returns 0 if all of them succeeded."""
+    port = env.GetOpenOCDDaemonPort()
+    if not port:
+        return 1
+    try:
+        results = _send(port, ["catch {%s}" % c for c in commands])
+    except (socket.error, socket.timeout) as e:
+        print("Error: Lost connection to the OpenOCD daemon: %s" % e)
+        return 1
+    for command, result in zip(commands, results):
+        if result.strip() != "0":
+            print("Error: OpenOCD command failed: %s" % command)
+            return 1
+    return 0
+
+
+def StopOpenOCDDaemon(*args, **kwargs):  # pylint: disable=unused-argument
+    env = args[0]
+    state_path = _state_path(env)
+    if not isfile(state_path):
+        return 0
+    with open(state_path) as fp:
+        state = json.load(fp)
+    try:
+        _send(state["port"], ["shutdown"], timeout=5)
+    except (socket.error, socket.timeout):
+        pass
+    os.remove(state_path)
+    print("Stopped OpenOCD daemon on Tcl port %d" % state["port"])
+    return 0
+
+
+def OpenOCDDaemonUpload(_, target, source, env):
+    result = env.RunOpenOCDCommands([
+        env.subst(c, target=target, source=source)
+        for c in env["OPENOCD_PROGRAM_COMMANDS"]])
+    if result:
+        # the probe may have been replugged, retry with a fresh OpenOCD
+        env.StopOpenOCDDaemon()
+        result = env.Execute(
+            env.subst("$UPLOADCMD", target=target, source=source))
+    return result
+
+
+env.AddMethod(IsOpenOCDDaemonEnabled)
+env.AddMethod(GetOpenOCDDaemonPort)
+env.AddMethod(RunOpenOCDCommands)
+env.AddMethod(StopOpenOCDDaemon)
+env.AddMethod(OpenOCDDaemonUpload)
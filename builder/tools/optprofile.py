@@ -0,0 +1,108 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Optimization profiles ("board_build.opt_profile = size|balanced|speed")
+# and RAM resident functions ("board_build.ramfuncs = func1, func2").
+#
+# Functions placed into the ".ramfunc" section are copied to RAM together
+# with .data by the startup code, so they run without flash wait states.
+# Code can use __attribute__((section(".ramfunc"))), the functions listed
+# in "board_build.ramfuncs" are moved there after compilation.
+#
+
+import re
+import sys
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+OPT_PROFILES = {
+    "size": dict(
+        CCFLAGS=["-Os", "--param", "max-inline-insns-single=500"],
+        LINKFLAGS=["-Os"]
+    ),
+    "balanced": dict(
+        CCFLAGS=["-O2", "-fno-ipa-cp-clone",
+                 "--param", "max-inline-insns-auto=20"],
+        LINKFLAGS=["-O2"]
+    ),
+    "speed": dict(
+        CCFLAGS=["-O2", "-funroll-loops",
+                 "-falign-functions=4", "-falign-loops=4"],
+        LINKFLAGS=["-O2"]
+    )
+}
+
+
+def _strip_optimization_flags(flags):
+    result = []
+    skip_next = False
+    for i, flag in enumerate(flags):
+        if skip_next:
+            skip_next = False
+            continue
+        if re.match(r"^-O[0-3sgz]?$", str(flag)):
+            continue
+        if flag == "--param" and i + 1 < len(flags) and str(
+                flags[i + 1]).startswith("max-inline-insns-"):
+            skip_next = True
+            continue
+        result.append(flag)
+    return result
+
+
+def ApplyOptimizationProfile(env):
+    """Replace the optimization flags of the framework by the ones of the
+    selected profile. Without "board_build.opt_profile" nothing changes."""
+    profile = board.get("build.opt_profile", "")
+    if not profile:
+        return
+    if profile not in OPT_PROFILES:
+        sys.stderr.write(
+            "Error: Unknown optimization profile %s. Available: %s\n" % (
+                profile, ", ".join(sorted(OPT_PROFILES))))
+        env.Exit(1)
+    for var in ("CCFLAGS", "LINKFLAGS"):
+        env.Replace(**{var: _strip_optimization_flags(env.get(var, []))})
+        env.Prepend(**{var: OPT_PROFILES[profile][var]})
+
+
+def ApplyRamFunctions(env):
+    functions = [
+        f for f in re.split(r"[\s,]+", board.get("build.ramfuncs", "")) if f]
+    if not functions:
+        return
+    if env.IsLTOEnabled():
+        sys.stderr.write(
+            "Warning! board_build.ramfuncs has no effect with LTO, use "
+            "__attribute__((section(\".ramfunc\"))) instead\n")
+        return
+    # with -ffunction-sections every function has its own ".text.<name>"
+    # section, rename it right after the object was compiled
+    env.Replace(
+        RAMFUNC_FLAGS=[
+            "--rename-section .text.%s=.ramfunc.%s" % (f, f)
+            for f in functions
+        ]
+    )
+    for var in ("CCCOM", "CXXCOM", "SHCCCOM", "SHCXXCOM"):
+        if var in env:
+            env[var] = "%s && $OBJCOPY $RAMFUNC_FLAGS $TARGET" % env[var]
+
+
+env.AddMethod(ApplyOptimizationProfile)
+env.AddMethod(ApplyRamFunctions)
@@ -0,0 +1,183 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Delta OTA updates.
+#
+# "ota-release" stores firmware.bin in the release cache
+# ("board_build.ota_release_dir", default .releases/<env> in the project).
+# "ota-delta" diffs the current firmware.bin against a cached release
+# ("board_build.ota_base", default the latest one) and writes
+# $BUILD_DIR/wm_w600_delta.bin. The device applies it with runtime/otadelta
+# while it streams the patch: unchanged code is copied from the running
+# image, the result is an uncompressed OTA image which has to fit the
+# "ota" partition of the flash layout.
+#
+# Patch format (little endian):
+#
+#   "W6DP" version:u32 base_size:u32 base_crc32:u32 target_size:u32
+#   target_crc32:u32 header_size:u32 <OTA image header>
+#   ops: 0x01 offset:u32 length:u32  copy from the base
+#        0x02 length:u32 <data>      insert data
+#        0x00                        end
+#
+
+import hashlib
+import shutil
+import struct
+import zlib
+from os import makedirs
+from os.path import basename, getsize, isabs, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+PATCH_MAGIC = b"W6DP"
+PATCH_VERSION = 1
+OP_END, OP_COPY, OP_INSERT = 0, 1, 2
+# shortest match worth a copy op, Thumb code is halfword aligned
+MATCH_LEN = 16
+MATCH_ALIGN = 2
+
+env.SetDefault(
+    W60X_OTA_RELEASE_DIR=board.get(
+        "build.ota_release_dir", join("$PROJECT_DIR", ".releases", "$PIOENV"))
+)
+
+
+def make_delta_ops(base, target):
+    """Greedy copy/insert diff of two byte strings."""
+    index = {}
+    for offset in range(0, len(base) - MATCH_LEN + 1, MATCH_ALIGN):
+        index.setdefault(base[offset:offset + MATCH_LEN], offset)
+
+    ops = []
+    literal_start = 0
+    pos = 0
+    while pos <= len(target) - MATCH_LEN:
+        offset = index.get(target[pos:pos + MATCH_LEN])
+        if offset is None:
+            pos += 1
+            continue
+        length = MATCH_LEN
+        while (pos + length < len(target) and offset + length < len(base)
+               and target[pos + length] == base[offset + length]):
+            length += 1
+        # grow backwards into the pending literal
+        while (pos > literal_start and offset > 0
+               and target[pos - 1] == base[offset - 1]):
+            pos -= 1
+            offset -= 1
+            length += 1
+        if pos > literal_start:
+            ops.append((OP_INSERT, target[literal_start:pos]))
+        ops.append((OP_COPY, offset, length))
+        pos += length
+        literal_start = pos
+    if literal_start < len(target):
+        ops.append((OP_INSERT, target[literal_start:]))
+    return ops
+
+
+def write_patch(fp, base, target, image_header):
+    fp.write(PATCH_MAGIC + struct.pack(
+        "<IIIIII", PATCH_VERSION, len(base), zlib.crc32(base) & 0xFFFFFFFF,
+        len(target), zlib.crc32(target) & 0xFFFFFFFF, len(image_header)))
+    fp.write(image_header)
+    for op in make_delta_ops(base, target):
+        if op[0] == OP_COPY:
+            fp.write(struct.pack("<BII", OP_COPY, op[1], op[2]))
+        else:
+            fp.write(struct.pack("<BI", OP_INSERT, len(op[1])))
+            fp.write(op[1])
+    fp.write(struct.pack("<B", OP_END))
+
+
+def _release_dir(env):
+    return env.subst("$W60X_OTA_RELEASE_DIR")
+
+
+def _get_base_release(env):
+    base = board.get("build.ota_base", "")
+    release_dir = _release_dir(env)
+    if not base and isfile(join(release_dir, "latest")):
+        with open(join(release_dir, "latest")) as fp:
+            base = fp.read().strip()
+    if base and not isabs(base):
+        base = join(release_dir, base)
+    return base
+
+
+def StoreOTARelease(_, target, source, env):  # pylint: disable=unused-argument
+    firmware = source[0].get_abspath()
+    with open(firmware, "rb") as fp:
+        digest = hashlib.sha1(fp.read()).hexdigest()
+    name = "%s-%s.bin" % (
+        board.get("build.image_version", "G01.00.00"), digest[:8])
+    release_dir = _release_dir(env)
+    if not isdir(release_dir):
+        makedirs(release_dir)
+    shutil.copyfile(firmware, join(release_dir, name))
+    with open(join(release_dir, "latest"), "w") as fp:
+        fp.write(name)
+    print("Stored release %s in %s" % (name, release_dir))
+    return 0
+
+
+def BuildOTADelta(_, target, source, env):
+    base_path = _get_base_release(env)
+    if not base_path or not isfile(base_path):
+        print("Error: No base release found, store one with "
+              "\"pio run -t ota-release\" or set board_build.ota_base")
+        return 1
+
+    firmware = source[0].get_abspath()
+    with open(base_path, "rb") as fp:
+        base = fp.read()
+    with open(firmware, "rb") as fp:
+        new = fp.read()
+    image_header = env.GetUncompressedImageHeader(firmware)
+
+    slot = env.GetFlashPartition("ota")["size"]
+    if len(image_header) + len(new) > slot:
+        print("Error: The updated image (%d bytes) does not fit the OTA "
+              "partition (%d bytes)" % (len(image_header) + len(new), slot))
+        return 1
+
+    patch_path = target[0].get_abspath()
+    with open(patch_path, "wb") as fp:
+        write_patch(fp, base, new, image_header)
+
+    full_path = join(env.subst("$BUILD_DIR"), "wm_w600_gz.img")
+    print("Delta from %s: %d bytes (%.1f%% of firmware.bin%s)" % (
+        basename(base_path), getsize(patch_path),
+        100.0 * getsize(patch_path) / max(len(new), 1),
+        ", compressed image %d bytes" % getsize(full_path)
+        if isfile(full_path) else ""))
+    return 0
+
+
+def BuildOTADeltaModule(env):
+    module_dir = join(platform.get_dir(), "runtime", "otadelta")
+    env.Append(CPPPATH=[module_dir])
+    env.BuildSources(join("$BUILD_DIR", "W60xOTADelta"), module_dir)
+
+
+env.AddMethod(StoreOTARelease)
+env.AddMethod(BuildOTADelta)
+env.AddMethod(BuildOTADeltaModule)
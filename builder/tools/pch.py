@@ -0,0 +1,179 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Precompiled headers for SDK source groups ("board_build.sdk_pch = yes").
+#
+# The leading "#include" block of every C source of a group is scanned and
+# the headers which are included by at least half of the sources (and found
+# through CPPPATH, but not next to any source of the group, where a quoted
+# include would find it first) form the common header set. It is written to
+# $BUILD_DIR/pch/<group>.h and compiled to "<group>.h.gch" with the flags of
+# the group, so the .gch is rebuilt whenever CCFLAGS, CFLAGS or CPPDEFINES
+# change. Only the sources which include the whole set in their leading
+# block get "-include <group>.h"; GCC falls back to the plain header (and
+# warns) if the .gch does not match the flags of a source.
+#
+
+import hashlib
+import json
+import re
+from os import makedirs
+from os.path import dirname, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment
+from SCons.Tool import CScanner
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+LEADING_INCLUDE_RE = re.compile(r"^\s*#\s*include\s*([<\"])([^>\"]+)[>\"]")
+COMMENT_RE = re.compile(r"/\*.*?\*/|//[^\n]*", re.S)
+# a precompiled header only pays off if several sources share it
+PCH_MIN_SOURCES = 4
+
+
+def IsPCHEnabled(env):
+    return board.get("build.sdk_pch", "no") in ("yes", "true", "1")
+
+
+def _leading_includes(path):
+    """Return the headers included before the first other directive or
+    declaration of `path`."""
+    with open(path, "rb") as fp:
+        text = COMMENT_RE.sub("", fp.read().decode("latin-1"))
+    headers = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = LEADING_INCLUDE_RE.match(line)
+        if not match:
+            break
+        headers.append((match.group(1), match.group(2)))
+    return headers
+
+
+def _resolves(header, cpppath, src_dirs):
+    delim, path = header
+    if delim == "\"" and any(
+            isfile(join(src_dir, path)) for src_dir in src_dirs):
+        # a quoted include is looked up next to the source first, the
+        # precompiled header would pick the CPPPATH one instead
+        return False
+    return any(isfile(join(inc_dir, path)) for inc_dir in cpppath)
+
+
+def _detect_common_headers(sources, cpppath):
+    leading = dict((path, _leading_includes(path)) for path in sources)
+    src_dirs = set(dirname(path) for path in sources)
+    counts = {}
+    positions = {}
+    for headers in leading.values():
+        for index, header in enumerate(headers):
+            counts[header] = counts.get(header, 0) + 1
+            positions.setdefault(header, []).append(index)
+    common = [
+        header for header, count in counts.items()
+        if count * 2 >= len(sources) and _resolves(header, cpppath, src_dirs)
+    ]
+    # keep the order the sources use, headers may depend on each other
+    common.sort(key=lambda h: sum(positions[h]) / float(len(positions[h])))
+    users = [
+        path for path, headers in leading.items()
+        if common and set(common) <= set(headers)
+    ]
+    if len(users) < PCH_MIN_SOURCES:
+        return [], []
+    return common, sorted(users)
+
+
+def _write_if_changed(path, contents):
+    if isfile(path):
+        with open(path) as fp:
+            if fp.read() == contents:
+                return
+    if not isdir(dirname(path)):
+        makedirs(dirname(path))
+    with open(path, "w") as fp:
+        fp.write(contents)
+
+
+def UsePrecompiledHeader(env, name, src_dir, src_filter=None):
+    """Compile the common headers of a source group into a precompiled
+    header and use it for the group's sources. `env` must be a clone which
+    is only used for this group."""
+    src_dir = env.subst(src_dir)
+    cpppath = [env.subst(p) for p in env.Flatten(env.get("CPPPATH", []))]
+    key = hashlib.sha1(json.dumps(dict(
+        framework=platform.get_package_version("framework-wm60x-sdk"),
+        src_dir=src_dir,
+        src_filter=src_filter or "",
+        cpppath=cpppath
+    ), sort_keys=True).encode("utf-8")).hexdigest()
+
+    db_path = join(env.subst("$BUILD_DIR"), "pch.json")
+    db = {}
+    if isfile(db_path):
+        with open(db_path) as fp:
+            db = json.load(fp)
+
+    if key not in db:
+        sources = [
+            join(src_dir, item)
+            for item in env.MatchSourceFiles(src_dir, src_filter)
+            if item.endswith(".c")
+        ]
+        headers, users = _detect_common_headers(sources, cpppath)
+        db[key] = dict(headers=headers, users=users)
+        if not isdir(dirname(db_path)):
+            makedirs(dirname(db_path))
+        with open(db_path, "w") as fp:
+            json.dump(db, fp, indent=2)
+
+    headers = db[key]["headers"]
+    users = set(db[key]["users"])
+    if not headers:
+        return None
+
+    header = join(env.subst("$BUILD_DIR"), "pch", "%s.h" % name)
+    _write_if_changed(header, "".join(
+        "#include %s%s%s\n" % (
+            delim, path, ">" if delim == "<" else "\"")
+        for delim, path in headers))
+
+    # the command line is part of the target signature, so changed
+    # CFLAGS/CCFLAGS/CPPDEFINES/CPPPATH rebuild the .gch
+    gch = env.Command(
+        header + ".gch", header,
+        env.VerboseAction(
+            "$CC -x c-header -o $TARGET -c $CFLAGS $CCFLAGS $_CCCOMCOM "
+            "$SOURCE", "Precompiling $SOURCE"),
+        source_scanner=CScanner)
+    cflags = env.Flatten(env.get("CFLAGS", [])) + [
+        "-include", header, "-Winvalid-pch"]
+
+    def _use_pch(node):
+        if node.srcnode().get_abspath() not in users:
+            return node
+        obj = env.Object(node, CFLAGS=cflags)
+        env.Depends(obj, gch)
+        return obj[0]
+
+    env.AddBuildMiddleware(_use_pch, "*.c")
+    return gch
+
+
+env.AddMethod(IsPCHEnabled)
+env.AddMethod(UsePrecompiledHeader)
@@ -0,0 +1,73 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Profile guided optimization.
+#
+#   pio run -t pgo-instrument   build with -fprofile-generate
+#   pio run -t pgo-collect      flash the instrumented image over OpenOCD,
+#                               run it and receive the .gcda files through
+#                               ARM semihosting
+#   pio run -t pgo-use          rebuild with -fprofile-use
+#
+# The firmware has to call initialise_monitor_handles() at start-up and
+# __gcov_dump() (__gcov_flush() for GCC < 11) once the test run is done.
+# "board_build.pgo = use" keeps using the collected profile for every build.
+#
+
+from os.path import join
+
+from SCons.Script import COMMAND_LINE_TARGETS, DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+env.SetDefault(
+    PGO_PROFILE_DIR=join("$PROJECT_DIR", ".pgo", "$PIOENV")
+)
+
+
+def GetPGOMode(env):
+    if set(["pgo-instrument", "pgo-collect"]) & set(COMMAND_LINE_TARGETS):
+        return "instrument"
+    if "pgo-use" in COMMAND_LINE_TARGETS or board.get(
+            "build.pgo", "") == "use":
+        return "use"
+    return None
+
+
+def ApplyPGOFlags(env):
+    mode = env.GetPGOMode()
+    if mode == "instrument":
+        env.Append(
+            CCFLAGS=["-fprofile-generate=$PGO_PROFILE_DIR"],
+            LINKFLAGS=["-fprofile-generate=$PGO_PROFILE_DIR"]
+        )
+        # gcov writes the .gcda files through the semihosting syscalls
+        env.Replace(LINKFLAGS=[
+            f for f in env["LINKFLAGS"] if f != "--specs=nosys.specs"])
+        env.Append(LINKFLAGS=["--specs=rdimon.specs"])
+    elif mode == "use":
+        env.Append(
+            CCFLAGS=[
+                "-fprofile-use=$PGO_PROFILE_DIR",
+                "-fprofile-correction",
+                "-Wno-missing-profile"
+            ],
+            LINKFLAGS=["-fprofile-use=$PGO_PROFILE_DIR"]
+        )
+
+
+env.AddMethod(GetPGOMode)
+env.AddMethod(ApplyPGOFlags)
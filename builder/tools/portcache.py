@@ -0,0 +1,176 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Cached upload port autodetection.
+#
+# Replaces env.AutodetectUploadPort for the serial and blackmagic uploads.
+# The detected port and the USB ids (VID:PID SER=...) of all adapters are
+# cached together with the list of serial device names. As long as no
+# adapter is plugged in or removed the cached port is used right away,
+# otherwise the candidate ports are enumerated and probed concurrently.
+#
+
+import json
+import re
+import threading
+from fnmatch import fnmatch
+from glob import glob
+from os import makedirs
+from os.path import dirname, isdir, isfile, join
+from platform import system
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+env.SetDefault(
+    W60X_PORT_CACHE=join("$PROJECT_CORE_DIR", ".cache", "w60x-ports.json")
+)
+
+
+def _list_device_names():
+    # cheap on POSIX, no USB descriptors are read
+    if system() != "Windows":
+        return sorted(
+            glob("/dev/ttyUSB*") + glob("/dev/ttyACM*") +
+            glob("/dev/cu.usb*") + glob("/dev/tty.usb*"))
+    from serial.tools.list_ports import comports
+    return sorted(p[0] for p in comports() if p[0])
+
+
+def _load_cache(env):
+    path = env.subst("$W60X_PORT_CACHE")
+    if not isfile(path):
+        return {}
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except ValueError:
+        return {}
+
+
+def _save_cache(env, cache):
+    path = env.subst("$W60X_PORT_CACHE")
+    if not isdir(dirname(path)):
+        makedirs(dirname(path))
+    with open(path, "w") as fp:
+        json.dump(cache, fp, indent=2)
+
+
+def _usb_id(hwid):
+    # the location changes with the USB socket, skip it
+    return re.sub(r"\s*LOCATION=\S*", "", hwid).strip()
+
+
+def _probe(port, result):
+    import serial  # shipped with PlatformIO
+    try:
+        # only check the port is usable, talking to the ROM would reset
+        # whatever else is connected
+        ser = serial.Serial(port, timeout=0.1)
+        ser.close()
+        result[port] = True
+    except (serial.SerialException, OSError):
+        result[port] = False
+
+
+def _get_candidates(env, ports):
+    protocol = env.subst("$UPLOAD_PROTOCOL")
+    pattern = env.subst("$UPLOAD_PORT") if "UPLOAD_PORT" in env else ""
+    hwids = [
+        ("%s:%s" % (h[0], h[1])).replace("0x", "").upper()
+        for h in board.get("build.hwids", [])
+    ]
+    candidates = []
+    for item in ports:
+        if pattern and not fnmatch(item["port"], pattern):
+            continue
+        if protocol.startswith("blackmagic"):
+            if "GDB" in item["description"]:
+                candidates.insert(0, item)
+        elif any(h in item["hwid"].upper() for h in hwids):
+            candidates.insert(0, item)
+        else:
+            candidates.append(item)
+    return candidates
+
+
+def _resolve_port(env):
+    from platformio.util import get_serial_ports
+    ports = get_serial_ports(filter_hwid=True)
+    candidates = _get_candidates(env, ports)
+    results = {}
+    threads = [
+        threading.Thread(target=_probe, args=(item["port"], results))
+        for item in candidates
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    port = None
+    for item in candidates:
+        if results.get(item["port"]):
+            port = item["port"]
+            break
+    devices = dict((item["port"], _usb_id(item["hwid"])) for item in ports)
+    return port, devices
+
+
+def GetSerialPortUSBId(env, port):
+    """USB id of the adapter behind "port" from the port cache, None if
+    it is unknown."""
+    return _load_cache(env).get("devices", {}).get(port)
+
+
+def ResolveUploadPort(*args, **kwargs):  # pylint: disable=unused-argument
+    env = args[0]
+    upload_port = env.subst("$UPLOAD_PORT")
+    if upload_port and not any(c in upload_port for c in "*?["):
+        print(env.subst("Use manually specified: $UPLOAD_PORT"))
+        return None
+
+    key = "%s|%s|%s" % (
+        env.subst("$UPLOAD_PROTOCOL"), env.subst("$BOARD"), upload_port)
+    tree = _list_device_names()
+    cache = _load_cache(env)
+    port = None
+    if cache.get("tree") == tree:
+        port = cache.get("ports", {}).get(key)
+    if port:
+        print("Auto-detected (cached): %s" % port)
+    else:
+        port, devices = _resolve_port(env)
+        if not port:
+            # fall back to the PlatformIO detection and its error message
+            return env.AutodetectUploadPort(*args[1:], **kwargs)
+        if cache.get("tree") != tree:
+            cache = dict(tree=tree, ports={})
+        cache["ports"][key] = port
+        cache["devices"] = devices
+        _save_cache(env, cache)
+        print("Auto-detected: %s" % port)
+
+    if env.subst("$UPLOAD_PROTOCOL").startswith("blackmagic") and \
+            system() == "Windows" and port.startswith("COM") and len(port) > 4:
+        port = "\\\\.\\%s" % port
+    env.Replace(UPLOAD_PORT=port)
+    return None
+
+
+env.AddMethod(GetSerialPortUSBId)
+env.AddMethod(ResolveUploadPort)
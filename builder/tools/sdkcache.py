@@ -0,0 +1,153 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Content-addressed cache of prebuilt SDK archives.
+#
+# Every SDK source group is compiled once into a static archive which is
+# stored in a shared directory outside of $BUILD_DIR. The archive is keyed by
+# the toolchain and framework versions, the compiler flags and the source
+# filter, so every other project using the same configuration just links it.
+# The keys are computed after BuildProgram, once PlatformIO has applied the
+# debug flags and BUILD_UNFLAGS.
+#
+
+import hashlib
+import json
+import shutil
+from os import getpid, makedirs, remove, rename
+from os.path import basename, dirname, isdir, isfile, join
+
+from SCons.Script import Copy, DefaultEnvironment
+
+env = DefaultEnvironment()
+platform = env.PioPlatform()
+board = env.BoardConfig()
+
+# groups declared by BuildSDKArchive, created by ResolveSDKArchives
+_pending = []
+
+env.SetDefault(
+    W60X_SDK_CACHE_DIR=board.get(
+        "build.sdk_cache_dir", join("$PROJECT_CORE_DIR", ".cache", "w60x-sdk"))
+)
+
+
+def _flag_list(env, name):
+    return [str(f) for f in env.Flatten(env.get(name, []))]
+
+
+def GetSDKArchiveKey(env, src_dir, src_filter=None):
+    config = dict(
+        toolchain=platform.get_package_version("toolchain-gccarmnoneeabi"),
+        framework=platform.get_package_version("framework-wm60x-sdk"),
+        cc=env.subst("$CC"),
+        ccflags=_flag_list(env, "CCFLAGS"),
+        cflags=_flag_list(env, "CFLAGS"),
+        cxxflags=_flag_list(env, "CXXFLAGS"),
+        asflags=_flag_list(env, "ASFLAGS"),
+        cppdefines=_flag_list(env, "CPPDEFINES"),
+        cpppath=[env.subst(p) for p in _flag_list(env, "CPPPATH")],
+        ramfuncs=_flag_list(env, "RAMFUNC_FLAGS"),
+        src_dir=env.subst(src_dir),
+        src_filter=src_filter or "",
+        build_type=env.GetBuildType(),
+        unflags=_flag_list(env, "BUILD_UNFLAGS")
+    )
+    return hashlib.sha1(
+        json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _install_archive(target, source, env):
+    # other build processes may share the cache directory, so never expose
+    # a partially written archive
+    dst = target[0].get_abspath()
+    if not isdir(dirname(dst)):
+        makedirs(dirname(dst))
+    tmp = "%s.%d.tmp" % (dst, getpid())
+    shutil.copyfile(source[0].get_abspath(), tmp)
+    if isfile(dst):
+        remove(tmp)
+        return None
+    rename(tmp, dst)
+    return None
+
+
+def BuildSDKArchive(env, name, variant_dir, src_dir, src_filter=None):
+    """Return the node of the static archive "lib<name>.a" for a source
+    group. The archive is only declared here and resolved by
+    ResolveSDKArchives once the build flags are final."""
+    _pending.append((env, name, variant_dir, src_dir, src_filter))
+    return env.File(env.subst(
+        join("$BUILD_DIR", "${LIBPREFIX}%s${LIBSUFFIX}" % name)))
+
+
+def _apply_late_flags(group_env):
+    # PlatformIO applies these to the default environment only after the
+    # framework script returned, clones made by it have to catch up
+    if group_env.GetBuildType() == "debug":
+        group_env.ConfigureDebugFlags()
+    group_env.ProcessUnFlags(group_env.get("BUILD_UNFLAGS"))
+
+
+def _resolve_archive(group_env, name, variant_dir, src_dir, src_filter):
+    # PGO builds depend on the profile data, not only on the flags
+    if not board.get("build.sdk_cache", "yes") in ("yes", "true", "1") \
+            or group_env.GetPGOMode():
+        return group_env.StaticLibrary(
+            join("$BUILD_DIR", name),
+            group_env.SortByCompileTime(group_env.CollectBuildFiles(
+                variant_dir, src_dir, src_filter)))[0]
+
+    key = group_env.GetSDKArchiveKey(src_dir, src_filter)
+    archive = join(env.subst("$W60X_SDK_CACHE_DIR"), key, "lib%s.a" % name)
+    target = join("$BUILD_DIR", "${LIBPREFIX}%s${LIBSUFFIX}" % name)
+    if isfile(archive):
+        print("Using cached %s (%s)" % (basename(archive), key[:10]))
+        group_env.AddBuildGraphGroup(variant_dir, src_dir, src_filter)
+        return group_env.Command(
+            target, archive,
+            group_env.VerboseAction(
+                Copy("$TARGET", "$SOURCE"), "Using cached $SOURCE"))[0]
+
+    library = group_env.StaticLibrary(
+        join("$BUILD_DIR", name),
+        group_env.SortByCompileTime(
+            group_env.CollectBuildFiles(variant_dir, src_dir, src_filter)))
+    group_env.Depends(env["PIOMAINPROG"], group_env.Command(
+        archive, library,
+        group_env.VerboseAction(_install_archive, "Caching $TARGET")))
+    return library[0]
+
+
+def ResolveSDKArchives(env):
+    """Create the archives declared by BuildSDKArchive, either from the
+    cache or from the sources. Called after BuildProgram, when PlatformIO
+    has applied the debug flags and BUILD_UNFLAGS, so the cache keys cover
+    the flags the sources are really compiled with."""
+    libs = []
+    while _pending:
+        group_env, name, variant_dir, src_dir, src_filter = _pending.pop(0)
+        if group_env is not env:
+            _apply_late_flags(group_env)
+        libs.append(_resolve_archive(
+            group_env, name, variant_dir, src_dir, src_filter))
+    # dependencies are visited in this order, start the slowest group first
+    if libs:
+        env.Depends(env["PIOMAINPROG"], env.SortByCompileTime(libs))
+
+
+env.AddMethod(GetSDKArchiveKey)
+env.AddMethod(BuildSDKArchive)
+env.AddMethod(ResolveSDKArchives)
@@ -0,0 +1,175 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Section level size report ("sizereport" target).
+#
+# The linker map is parsed to attribute .text/.rodata/.data/.bss and the
+# RAM resident code (.ramfunc, placed in .data) of every linked input
+# section to its component: the source group below $BUILD_DIR (src,
+# SDKApps, FrameworkArduino, ...) or the static archive it was taken from
+# (libsdknetwork.a, libwlan.a, wmlwip.a, ...). The largest symbols are
+# taken from the ELF symbol table. The report is stored as
+# $BUILD_DIR/sizereport.json together with the difference to the previous
+# report.
+#
+
+import json
+import re
+import subprocess
+from os.path import abspath, basename, isfile, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+
+SECTION_KINDS = (
+    # RAM resident functions, copied to RAM with .data at startup
+    ("ramfunc", (".ramfunc",)),
+    ("text", (".text", ".init", ".fini", ".ARM", ".glue")),
+    ("rodata", (".rodata",)),
+    ("data", (".data", "vtable", ".init_array", ".fini_array",
+              ".preinit_array", ".jcr")),
+    ("bss", (".bss", "COMMON", ".noinit"))
+)
+INPUT_SECTION_RE = re.compile(
+    r"^ (\S+)?\s+0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)\s+(\S.*)$")
+ARCHIVE_MEMBER_RE = re.compile(r"^(.*\.a)\((.+)\)$")
+
+
+def _section_kind(name):
+    for kind, prefixes in SECTION_KINDS:
+        if name.startswith(prefixes):
+            return kind
+    return None
+
+
+def _component(path, build_dir):
+    match = ARCHIVE_MEMBER_RE.match(path)
+    if match:
+        return basename(match.group(1))
+    path = abspath(path)
+    if path.startswith(build_dir):
+        return path[len(build_dir):].strip("/\\").replace("\\", "/").split(
+            "/")[0]
+    return basename(path)
+
+
+def parse_map(map_path, build_dir):
+    components = {}
+    in_memory_map = False
+    pending_name = None
+    with open(map_path) as fp:
+        for line in fp:
+            line = line.rstrip("\n")
+            if line.startswith("Linker script and memory map"):
+                in_memory_map = True
+                continue
+            if not in_memory_map:
+                continue
+            if line.startswith(" ") and len(line.split()) == 1 \
+                    and not line.strip().startswith("0x"):
+                # long input section names are wrapped onto the next line
+                pending_name = line.strip()
+                continue
+            match = INPUT_SECTION_RE.match(line)
+            if not match:
+                pending_name = None
+                continue
+            name = match.group(1) or pending_name
+            pending_name = None
+            address, size = int(match.group(2), 16), int(match.group(3), 16)
+            if not name or not address or not size:
+                continue
+            kind = _section_kind(name)
+            if not kind:
+                continue
+            component = _component(match.group(4).strip(), build_dir)
+            sizes = components.setdefault(
+                component, dict(text=0, rodata=0, data=0, bss=0, ramfunc=0))
+            sizes[kind] += size
+    for sizes in components.values():
+        sizes["flash"] = sizes["text"] + sizes["rodata"] + sizes["data"] + \
+            sizes["ramfunc"]
+        sizes["ram"] = sizes["data"] + sizes["bss"] + sizes["ramfunc"]
+    return components
+
+
+def parse_symbols(env, elf_path, limit=30):
+    output = subprocess.check_output(
+        [env.subst("$NM"), "--print-size", "--size-sort", "--reverse-sort",
+         "--demangle", elf_path], env=env["ENV"])
+    symbols = []
+    for line in output.decode("utf-8", "replace").splitlines():
+        parts = line.split(None, 3)
+        if len(parts) != 4:
+            continue
+        symbols.append(dict(
+            name=parts[3], size=int(parts[1], 16), type=parts[2]))
+        if len(symbols) >= limit:
+            break
+    return symbols
+
+
+def _diff(current, previous):
+    diff = {}
+    for component in set(current) | set(previous):
+        now = current.get(component, {})
+        before = previous.get(component, {})
+        delta = dict(
+            (k, now.get(k, 0) - before.get(k, 0))
+            for k in ("text", "rodata", "data", "bss", "ramfunc", "flash",
+                      "ram"))
+        if any(delta.values()):
+            diff[component] = delta
+    return diff
+
+
+def SizeReport(_, target, source, env):  # pylint: disable=unused-argument
+    build_dir = abspath(env.subst("$BUILD_DIR"))
+    map_path = env.subst("$BUILD_DIR/${PROGNAME}.map")
+    report_path = join(build_dir, "sizereport.json")
+    if not isfile(map_path):
+        print("Error: Linker map %s not found" % map_path)
+        return 1
+
+    components = parse_map(map_path, build_dir)
+    previous = {}
+    if isfile(report_path):
+        with open(report_path) as fp:
+            previous = json.load(fp).get("components", {})
+    report = dict(
+        components=components,
+        symbols=parse_symbols(env, source[0].get_abspath()),
+        diff=_diff(components, previous))
+    with open(report_path, "w") as fp:
+        json.dump(report, fp, indent=2)
+
+    print("%-32s %9s %9s %9s %9s %9s %9s" % (
+        "Component", ".text", ".rodata", ".data", ".bss", ".ramfunc",
+        "delta"))
+    for name, sizes in sorted(
+            components.items(), key=lambda item: -item[1]["flash"]):
+        delta = report["diff"].get(name, {}).get("flash", 0)
+        print("%-32s %9d %9d %9d %9d %9d %+9d" % (
+            name[:32], sizes["text"], sizes["rodata"], sizes["data"],
+            sizes["bss"], sizes["ramfunc"], delta))
+    print("Largest symbols:")
+    for symbol in report["symbols"][:10]:
+        print("  %7d %s %s" % (symbol["size"], symbol["type"], symbol["name"]))
+    print("Report written to %s" % report_path)
+    return 0
+
+
+env.AddMethod(SizeReport)
@@ -0,0 +1,147 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Adaptive download speed for serial uploads.
+#
+# With "board_upload.adaptive_speed = yes" the download speed (wm_tool -ds)
+# starts at the best speed known for the USB serial adapter and falls back
+# to the next lower speed when the upload fails. The fastest stable speed is
+# cached per adapter (USB VID:PID and serial number).
+#
+
+import json
+import re
+import time
+from os import makedirs
+from os.path import dirname, getsize, isdir, isfile, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+# download speeds supported by wm_tool, fastest first
+DOWNLOAD_SPEEDS = [2000000, 1000000, 921600, 460800, 115200]
+
+env.SetDefault(
+    WM_DOWNLOAD_SPEED="$UPLOAD_SPEED",
+    W60X_UPLOAD_SPEED_CACHE=join(
+        "$PROJECT_CORE_DIR", ".cache", "w60x-upload-speed.json")
+)
+
+
+def GetUploadAdapterId(env, port=None):
+    port = port or env.subst("$UPLOAD_PORT")
+    usb_id = env.GetSerialPortUSBId(port)
+    if usb_id and "VID:PID" in usb_id:
+        return usb_id
+    try:
+        from platformio.util import get_serial_ports
+        for item in get_serial_ports():
+            if item["port"] == port and "VID:PID" in item.get("hwid", ""):
+                # the location changes with the USB socket, skip it
+                return re.sub(r"\s*LOCATION=\S*", "", item["hwid"]).strip()
+    except ImportError:
+        pass
+    return port
+
+
+def _load_cache(env):
+    path = env.subst("$W60X_UPLOAD_SPEED_CACHE")
+    if not isfile(path):
+        return {}
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def _save_cache(env, cache):
+    path = env.subst("$W60X_UPLOAD_SPEED_CACHE")
+    if not isdir(dirname(path)):
+        makedirs(dirname(path))
+    with open(path, "w") as fp:
+        json.dump(cache, fp, indent=2)
+
+
+def _upload_at(env, target, source, speed):
+    return env.Execute(env.Override({"WM_DOWNLOAD_SPEED": str(speed)}).subst(
+        "$UPLOADCMD", target=target, source=source))
+
+
+def ExecuteSerialUpload(env, target, source):
+    if board.get("upload.adaptive_speed", "no") not in ("yes", "true", "1"):
+        return env.Execute(
+            env.subst("$UPLOADCMD", target=target, source=source))
+
+    adapter = env.GetUploadAdapterId()
+    cache = _load_cache(env)
+    start_speed = cache.get(adapter, DOWNLOAD_SPEEDS[0])
+    result = 1
+    for speed in [s for s in DOWNLOAD_SPEEDS if s <= start_speed]:
+        print("Trying download speed %d" % speed)
+        result = _upload_at(env, target, source, speed)
+        if not result:
+            if cache.get(adapter) != speed:
+                cache[adapter] = speed
+                _save_cache(env, cache)
+            break
+        print("Upload at %d failed, falling back" % speed)
+    return result
+
+
+def AdaptiveSerialUpload(_, target, source, env):
+    return env.ExecuteSerialUpload(target, source)
+
+
+def BenchmarkSerialUpload(_, target, source, env):
+    size = getsize(source[0].get_abspath())
+    results = []
+    for speed in sorted(DOWNLOAD_SPEEDS):
+        start = time.time()
+        failed = _upload_at(env, target, source, speed)
+        duration = time.time() - start
+        results.append(dict(
+            speed=speed,
+            success=not failed,
+            duration=round(duration, 3),
+            bytes_per_sec=int(size / duration) if not failed else 0))
+
+    report = dict(
+        adapter=env.GetUploadAdapterId(),
+        image=source[0].get_abspath(),
+        size=size,
+        results=results)
+    with open(join(env.subst("$BUILD_DIR"), "upload_benchmark.json"),
+              "w") as fp:
+        json.dump(report, fp, indent=2)
+
+    print("%10s %8s %10s %12s" % ("Speed", "Result", "Time", "Bytes/sec"))
+    for r in results:
+        print("%10d %8s %9.2fs %12d" % (
+            r["speed"], "OK" if r["success"] else "FAILED", r["duration"],
+            r["bytes_per_sec"]))
+    stable = [r["speed"] for r in results if r["success"]]
+    if not stable:
+        print("Error: Upload failed at every download speed")
+        return 1
+    cache = _load_cache(env)
+    cache[report["adapter"]] = max(stable)
+    _save_cache(env, cache)
+    return 0
+
+
+env.AddMethod(GetUploadAdapterId)
+env.AddMethod(ExecuteSerialUpload)
+env.AddMethod(AdaptiveSerialUpload)
+env.AddMethod(BenchmarkSerialUpload)
@@ -0,0 +1,189 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#
+# Native W60x image generator (same output files as "wm_tool -fc compress
+# -df"). Everything is streamed in chunks, images are never loaded into
+# memory as a whole.
+#
+#   wm_w600.fls     secboot.img, padded to the secboot area, + run image
+#   wm_w600_gz.img  gzip compressed image for OTA updates
+#   wm_w600_dbg.img run image, flashed at 0x8010000 by OpenOCD
+#
+# wm_tool still creates the images which are flashed. With
+# "board_build.image_check = yes" the native images are generated next to
+# them in $BUILD_DIR/image_check and compared byte for byte, the native
+# generator is only used once that check passes for the supported layouts.
+#
+
+import shutil
+import struct
+import tempfile
+import zlib
+from os import close, makedirs, remove
+from os.path import basename, isdir, join
+
+from SCons.Script import DefaultEnvironment
+
+env = DefaultEnvironment()
+board = env.BoardConfig()
+
+IMG_HEAD_MAGIC_NO = 0xA0FFFF9F
+IMG_HEAD_FORMAT = "<IHHIIIIIII16s"  # followed by the header checksum
+IMG_HEAD_PADDED_LEN = 0x100  # code starts at run address 0x...100
+SECBOOT_AREA_LEN = 56 * 1024
+LAYOUT_TYPES = {"1M": 0, "2M": 3}
+ZIP_TYPE_UNCOMPRESS = 0
+ZIP_TYPE_COMPRESS = 1
+CHUNK_SIZE = 64 * 1024
+
+
+def _iter_chunks(fp):
+    while True:
+        chunk = fp.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _crc32(path):
+    """CRC as computed by wm_tool (reflected CRC-32, no final XOR)."""
+    crc = 0
+    length = 0
+    with open(path, "rb") as fp:
+        for chunk in _iter_chunks(fp):
+            crc = zlib.crc32(chunk, crc)
+            length += len(chunk)
+    return (crc & 0xFFFFFFFF) ^ 0xFFFFFFFF, length
+
+
+def _image_header(layout, zip_type, run_addr, upd_addr, payload, version,
+                  upd_payload=None):
+    """The run fields describe the image secboot runs, the upd fields the
+    image as it is transferred, which differ for compressed images."""
+    run_checksum, run_length = _crc32(payload)
+    upd_checksum, upd_length = _crc32(upd_payload) if upd_payload else (
+        run_checksum, run_length)
+    head = struct.pack(
+        IMG_HEAD_FORMAT, IMG_HEAD_MAGIC_NO, LAYOUT_TYPES[layout], zip_type,
+        run_addr, run_length, run_checksum, upd_addr, upd_length,
+        upd_checksum, 0, version.encode("ascii")[:15])
+    return head + struct.pack(
+        "<I", (zlib.crc32(head) & 0xFFFFFFFF) ^ 0xFFFFFFFF)
+
+
+def _copy(src_path, dst_fp):
+    with open(src_path, "rb") as fp:
+        shutil.copyfileobj(fp, dst_fp, CHUNK_SIZE)
+
+
+def _pad(fp, length):
+    fp.write(b"\xff" * (length - fp.tell()))
+
+
+def write_run_image(fp, payload, layout, run_addr, upd_addr, version):
+    start = fp.tell()
+    fp.write(_image_header(
+        layout, ZIP_TYPE_UNCOMPRESS, run_addr, upd_addr, payload, version))
+    fp.write(b"\xff" * (IMG_HEAD_PADDED_LEN - (fp.tell() - start)))
+    _copy(payload, fp)
+
+
+def gzip_file(src_path, dst_path):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        for chunk in _iter_chunks(src):
+            dst.write(compressor.compress(chunk))
+        dst.write(compressor.flush())
+
+
+def generate_images(binary, secboot, out_prefix, layout, run_addr, upd_addr,
+                    version):
+    with open(out_prefix + "_dbg.img", "wb") as fp:
+        write_run_image(fp, binary, layout, run_addr, upd_addr, version)
+
+    with open(out_prefix + ".fls", "wb") as fp:
+        _copy(secboot, fp)
+        _pad(fp, SECBOOT_AREA_LEN)
+        write_run_image(fp, binary, layout, run_addr, upd_addr, version)
+
+    fd, compressed = tempfile.mkstemp(suffix=".gz")
+    close(fd)
+    try:
+        gzip_file(binary, compressed)
+        with open(out_prefix + "_gz.img", "wb") as fp:
+            fp.write(_image_header(
+                layout, ZIP_TYPE_COMPRESS, run_addr, upd_addr, binary,
+                version, upd_payload=compressed))
+            _copy(compressed, fp)
+    finally:
+        remove(compressed)
+
+
+def _first_difference(path_a, path_b):
+    """Offset of the first differing byte, None if the files are equal."""
+    offset = 0
+    with open(path_a, "rb") as fp_a, open(path_b, "rb") as fp_b:
+        while True:
+            chunk_a = fp_a.read(CHUNK_SIZE)
+            chunk_b = fp_b.read(CHUNK_SIZE)
+            if chunk_a != chunk_b:
+                for i, (a, b) in enumerate(zip(chunk_a, chunk_b)):
+                    if a != b:
+                        return offset + i
+                return offset + min(len(chunk_a), len(chunk_b))
+            if not chunk_a:
+                return None
+            offset += len(chunk_a)
+
+
+def CheckNativeImages(_, target, source, env):
+    """Generate the images natively and compare them with the ones of
+    wm_tool ("target"). Returns 1 on any difference."""
+    check_dir = join(env.subst("$BUILD_DIR"), "image_check")
+    if not isdir(check_dir):
+        makedirs(check_dir)
+    generate_images(
+        source[0].get_abspath(),
+        env.subst("$WM_IMAGE_SECBOOT"),
+        join(check_dir, "wm_w600"),
+        env.subst("$WM_IMAGE_TYPE"),
+        int(env.subst("$WM_IMAGE_RUN_ADDR"), 16),
+        int(env.subst("$WM_IMAGE_UPD_ADDR"), 16),
+        board.get("build.image_version", "G01.00.00"))
+    result = 0
+    for node in target:
+        reference = node.get_abspath()
+        native = join(check_dir, basename(reference))
+        offset = _first_difference(reference, native)
+        if offset is None:
+            print("Native %s matches wm_tool" % basename(reference))
+            continue
+        print("Error: Native %s differs from wm_tool at offset 0x%x" % (
+            basename(reference), offset))
+        result = 1
+    return result
+
+
+def GetUncompressedImageHeader(env, payload):
+    """Header of an uncompressed OTA image for the binary "payload"."""
+    return _image_header(
+        env.subst("$WM_IMAGE_TYPE"), ZIP_TYPE_UNCOMPRESS,
+        int(env.subst("$WM_IMAGE_RUN_ADDR"), 16),
+        int(env.subst("$WM_IMAGE_UPD_ADDR"), 16),
+        payload, board.get("build.image_version", "G01.00.00"))
+
+
+env.AddMethod(GetUncompressedImageHeader)
+env.AddMethod(CheckNativeImages)
@@ -0,0 +1,192 @@
+# Copyright 2014-present PlatformIO <contact@platformio.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+#
+# Decoder for the deferred log records of runtime/dlog
+# ("monitor_filters = w60x_dlog").
+#
+# The records only contain the offset of the format string in the
+# ".w60x_dlog" section of the ELF file and the raw arguments, the text is
+# formatted here. Bytes must reach the filter unchanged, so use
+# "--encoding latin-1" in monitor_flags together with the filter.
+#
+
+import json
+import os
+import re
+import struct
+
+from platformio.commands.device import DeviceMonitorFilter
+
+DLOG_SYNC = 0x1F
+DLOG_MAX_ARGS = 8
+DLOG_SECTION = ".w60x_dlog"
+
+FORMAT_RE = re.compile(
+    r"%([-+ #0]*)(\d+|\*)?(?:\.(\d+|\*))?(?:hh|h|ll|l|j|z|t|L)?"
+    r"([diouxXcspfeEgGaA%])")
+
+
+def read_elf_sections(path):
+    """Return {name: (address, flags, data)} of an ELF32 little endian
+    file."""
+    with open(path, "rb") as fp:
+        elf = fp.read()
+    if elf[:4] != b"\x7fELF" or elf[4:5] != b"\x01" or elf[5:6] != b"\x01":
+        raise ValueError("%s is not an ELF32 little endian file" % path)
+    shoff, = struct.unpack_from("<I", elf, 0x20)
+    shentsize, shnum, shstrndx = struct.unpack_from("<HHH", elf, 0x2E)
+    headers = [
+        struct.unpack_from("<IIIIII", elf, shoff + i * shentsize)
+        for i in range(shnum)
+    ]
+    strtab_offset = headers[shstrndx][4]
+    sections = {}
+    for name, type_, flags, addr, offset, size in headers:
+        end = elf.index(b"\0", strtab_offset + name)
+        name = elf[strtab_offset + name:end].decode("ascii", "replace")
+        # SHT_NOBITS sections have no data in the file
+        data = elf[offset:offset + size] if type_ != 8 else b""
+        sections[name] = (addr, flags, data)
+    return sections
+
+
+class W60xDeferredLog(DeviceMonitorFilter):
+    NAME = "w60x_dlog"
+
+    def __init__(self, *args, **kwargs):
+        super(W60xDeferredLog, self).__init__(*args, **kwargs)
+        self._buffer = bytearray()
+        self._formats = None
+        self._images = []
+
+    def __call__(self):
+        elf_path = self._get_elf_path()
+        if not elf_path or not os.path.isfile(elf_path):
+            print("--- w60x_dlog: firmware %s not found, records are not "
+                  "decoded" % elf_path)
+            return self
+        sections = read_elf_sections(elf_path)
+        if DLOG_SECTION not in sections:
+            print("--- w60x_dlog: %s has no %s section" % (
+                elf_path, DLOG_SECTION))
+            return self
+        self._formats = sections[DLOG_SECTION]
+        # SHF_ALLOC sections, used to resolve "%s" arguments
+        self._images = [
+            (addr, data) for addr, flags, data in sections.values()
+            if flags & 0x2 and data]
+        print("--- w60x_dlog: decoding with %s" % elf_path)
+        return self
+
+    def _get_elf_path(self):
+        if not self.environment:
+            return None
+        build_dir = self.config.get_optional_dir("build")
+        if self.project_dir and not os.path.isabs(build_dir):
+            build_dir = os.path.join(self.project_dir, build_dir)
+        build_dir = os.path.join(build_dir, self.environment)
+        # written by the build, the ELF file is named after $PROGNAME
+        program_path = os.path.join(build_dir, "w60x_dlog.json")
+        if os.path.isfile(program_path):
+            with open(program_path) as fp:
+                return json.load(fp)["program"]
+        return os.path.join(build_dir, "firmware.elf")
+
+    def _read_string(self, address):
+        for start, data in self._images:
+            if start <= address < start + len(data):
+                offset = address - start
+                end = data.find(b"\0", offset)
+                return data[offset:end if end >= 0 else len(data)].decode(
+                    "utf-8", "replace")
+        return "<0x%08x>" % address
+
+    def _format(self, fmt, args):
+        args = list(args)
+
+        def _next():
+            return args.pop(0) if args else 0
+
+        def _replace(match):
+            flags, width, precision, conv = match.groups()
+            if conv == "%":
+                return "%"
+            if width == "*":
+                width = str(_next())
+            if precision == "*":
+                precision = str(_next())
+            spec = "%" + flags + (width or "") + (
+                "." + precision if precision is not None else "")
+            value = _next()
+            if conv in "di":
+                return (spec + "d") % (value - (1 << 32)
+                                       if value & 0x80000000 else value)
+            if conv in "ouxX":
+                return (spec + conv) % value
+            if conv == "c":
+                return (spec + "c") % chr(value & 0xFF)
+            if conv == "s":
+                return (spec + "s") % self._read_string(value)
+            if conv == "p":
+                return (spec + "s") % ("0x%08x" % value)
+            # floating point arguments are not passed as 32-bit words
+            return "<%s?>" % match.group(0)
+
+        return FORMAT_RE.sub(_replace, fmt)
+
+    def _decode(self, record_id, args):
+        addr, _, data = self._formats
+        offset = record_id - addr
+        if not 0 <= offset < len(data):
+            return "<unknown dlog id 0x%08x>" % record_id
+        end = data.find(b"\0", offset)
+        fmt = data[offset:end if end >= 0 else len(data)].decode(
+            "utf-8", "replace")
+        return self._format(fmt, args)
+
+    def rx(self, text):
+        if self._formats is None:
+            return text
+        self._buffer.extend(text.encode("latin-1", "replace"))
+        output = []
+        while self._buffer:
+            start = self._buffer.find(bytearray([DLOG_SYNC]))
+            if start < 0:
+                start = len(self._buffer)
+            if start:
+                output.append(self._buffer[:start].decode("latin-1"))
+                del self._buffer[:start]
+                continue
+            if len(self._buffer) < 2:
+                break
+            nargs = self._buffer[1]
+            size = 1 + 1 + 4 + 4 * nargs + 1
+            if nargs > DLOG_MAX_ARGS:
+                size = 0
+            elif len(self._buffer) < size:
+                break
+            checksum = 0
+            for byte in self._buffer[1:size - 1]:
+                checksum ^= byte
+            if not size or checksum != self._buffer[size - 1]:
+                # not a record, pass the sync byte through and resync
+                output.append(chr(self._buffer[0]))
+                del self._buffer[:1]
+                continue
+            values = struct.unpack_from("<%dI" % (nargs + 1), self._buffer, 2)
+            output.append(self._decode(values[0], values[1:]))
+            del self._buffer[:size]
+        return "".join(output)
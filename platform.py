@@ -12,13 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+from os.path import getmtime, isfile
 from platform import system
 
 from platformio.managers.platform import PlatformBase
 from platformio.util import get_systype
 
+# the host does not change during a process, resolve it once
+JLINK_GDB_SERVER = ("JLinkGDBServerCL.exe"
+                    if system() == "Windows" else "JLinkGDBServer")
+
+
 class W60xPlatform(PlatformBase):
 
+    # processed "debug" sections by (board id, manifest path, mtime)
+    _debug_cache = {}
+
     def configure_default_packages(self, variables, targets):
         board = variables.get("board")
         build_core = variables.get(
@@ -71,6 +81,16 @@ class W60xPlatform(PlatformBase):
         return result
 
     def _add_default_debug_tools(self, board):
+        manifest_path = getattr(board, "manifest_path", None)
+        key = (board.id, manifest_path,
+               getmtime(manifest_path)
+               if manifest_path and isfile(manifest_path) else None)
+        if key not in self._debug_cache:
+            self._debug_cache[key] = self._get_default_debug_tools(board)
+        board.manifest['debug'] = copy.deepcopy(self._debug_cache[key])
+        return board
+
+    def _get_default_debug_tools(self, board):
         debug = board.manifest.get("debug", {})
         upload_protocols = board.manifest.get("upload", {}).get(
             "protocols", [])
@@ -99,9 +119,7 @@ class W60xPlatform(PlatformBase):
                             "-device", debug.get("jlink_device"),
                             "-port", "2331"
                         ],
-                        "executable": ("JLinkGDBServerCL.exe"
-                                       if system() == "Windows" else
-                                       "JLinkGDBServer")
+                        "executable": JLINK_GDB_SERVER
                     }
                 }
             else:
@@ -131,5 +149,4 @@ class W60xPlatform(PlatformBase):
             debug['tools'][link]['onboard'] = link in debug.get("onboard_tools", [])
             debug['tools'][link]['default'] = link in debug.get("default_tools", [])
 
-        board.manifest['debug'] = debug
-        return board
+        return debug
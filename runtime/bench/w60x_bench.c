@@ -0,0 +1,78 @@
+/*
+ * On-target benchmark harness for the W60x, see w60x_bench.h
+ */
+#include <stdio.h>
+
+#include "w60x_bench.h"
+
+#define DEMCR       (*(volatile unsigned int *)0xE000EDFC)
+#define DEMCR_TRCENA (1u << 24)
+#define DWT_CTRL    (*(volatile unsigned int *)0xE0001000)
+#define DWT_CYCCNT  (*(volatile unsigned int *)0xE0001004)
+#define DWT_CTRL_CYCCNTENA (1u << 0)
+
+struct w60x_bench {
+    const char *name;
+    w60x_bench_fn fn;
+    void *arg;
+    unsigned int iterations;
+};
+
+static struct w60x_bench benchmarks[W60X_BENCH_MAX];
+static unsigned int benchmark_count;
+
+void w60x_bench_cycles_init(void)
+{
+    DEMCR |= DEMCR_TRCENA;
+    DWT_CYCCNT = 0;
+    DWT_CTRL |= DWT_CTRL_CYCCNTENA;
+}
+
+unsigned int w60x_bench_cycles(void)
+{
+    return DWT_CYCCNT;
+}
+
+int w60x_bench_register(const char *name, w60x_bench_fn fn, void *arg,
+                        unsigned int iterations)
+{
+    if (benchmark_count >= W60X_BENCH_MAX || !fn || !iterations)
+        return -1;
+    benchmarks[benchmark_count].name = name;
+    benchmarks[benchmark_count].fn = fn;
+    benchmarks[benchmark_count].arg = arg;
+    benchmarks[benchmark_count].iterations = iterations;
+    benchmark_count++;
+    return 0;
+}
+
+void w60x_bench_run_all(void)
+{
+    unsigned int i, n;
+
+    w60x_bench_cycles_init();
+    for (i = 0; i < benchmark_count; i++) {
+        struct w60x_bench *b = &benchmarks[i];
+        unsigned long long total = 0;
+        unsigned int min = 0xFFFFFFFFu, max = 0;
+
+        for (n = 0; n < b->iterations; n++) {
+            unsigned int start = DWT_CYCCNT;
+            unsigned int cycles;
+
+            b->fn(b->arg);
+            /* unsigned arithmetic handles one counter wrap-around */
+            cycles = DWT_CYCCNT - start;
+            total += cycles;
+            if (cycles < min)
+                min = cycles;
+            if (cycles > max)
+                max = cycles;
+        }
+        /* newlib-nano printf has no %llu, print the average instead */
+        printf("@BENCH name=%s iterations=%u avg=%u min=%u max=%u\n",
+               b->name, b->iterations,
+               (unsigned int)(total / b->iterations), min, max);
+    }
+    printf("@BENCH-END count=%u\n", benchmark_count);
+}
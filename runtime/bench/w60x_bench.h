@@ -0,0 +1,41 @@
+/*
+ * On-target benchmark harness for the W60x (Cortex-M3).
+ *
+ * Benchmarks are timed with the DWT cycle counter (CYCCNT) and the results
+ * are printed to the console UART, one line per benchmark:
+ *
+ *   @BENCH name=<name> iterations=<n> avg=<cycles> min=<cycles> max=<cycles>
+ *   @BENCH-END count=<number of benchmarks>
+ *
+ * The "benchmark" target of the platform flashes the firmware, parses these
+ * lines and compares them against a stored baseline. The harness is only
+ * built for "pio run -t benchmark" or with "board_build.benchmark = yes",
+ * which also defines W60X_BENCHMARK.
+ */
+#ifndef W60X_BENCH_H
+#define W60X_BENCH_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define W60X_BENCH_MAX 32
+
+typedef void (*w60x_bench_fn)(void *arg);
+
+/* register a benchmark, `fn` is called `iterations` times */
+int w60x_bench_register(const char *name, w60x_bench_fn fn, void *arg,
+                        unsigned int iterations);
+
+/* run all registered benchmarks and print the results */
+void w60x_bench_run_all(void);
+
+/* raw access to the cycle counter */
+void w60x_bench_cycles_init(void);
+unsigned int w60x_bench_cycles(void);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif /* W60X_BENCH_H */
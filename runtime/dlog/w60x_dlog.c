@@ -0,0 +1,56 @@
+#include <stdarg.h>
+#include <stdio.h>
+
+#include "w60x_dlog.h"
+
+#if defined(WM_W600)
+#include "wm_uart.h"
+#endif
+
+/* sync, nargs, id, arguments, checksum */
+#define W60X_DLOG_RECORD_MAX (1 + 1 + 4 + 4 * W60X_DLOG_MAX_ARGS + 1)
+
+static unsigned int put_u32(unsigned char *buf, unsigned int value)
+{
+    buf[0] = value & 0xFF;
+    buf[1] = (value >> 8) & 0xFF;
+    buf[2] = (value >> 16) & 0xFF;
+    buf[3] = (value >> 24) & 0xFF;
+    return 4;
+}
+
+void w60x_dlog_write(unsigned int id, unsigned int nargs, ...)
+{
+    unsigned char record[W60X_DLOG_RECORD_MAX];
+    unsigned char sum = 0;
+    unsigned int len = 0;
+    unsigned int i;
+    va_list ap;
+
+    if (nargs > W60X_DLOG_MAX_ARGS)
+        nargs = W60X_DLOG_MAX_ARGS;
+
+    record[len++] = W60X_DLOG_SYNC;
+    record[len++] = (unsigned char)nargs;
+    len += put_u32(record + len, id);
+    va_start(ap, nargs);
+    for (i = 0; i < nargs; i++)
+        len += put_u32(record + len, va_arg(ap, unsigned int));
+    va_end(ap);
+    for (i = 1; i < len; i++)
+        sum ^= record[i];
+    record[len++] = sum;
+
+    w60x_dlog_output(record, len);
+}
+
+__attribute__((weak))
+void w60x_dlog_output(const unsigned char *buf, unsigned int len)
+{
+#if defined(WM_W600)
+    tls_uart_write(TLS_UART_0, (char *)buf, (unsigned short)len);
+#else
+    fwrite(buf, 1, len, stdout);
+    fflush(stdout);
+#endif
+}
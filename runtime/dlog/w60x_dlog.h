@@ -0,0 +1,51 @@
+/*
+ * Deferred (binary) logging for the W60x.
+ *
+ * W60X_DLOG() does not format on the device. The format string is placed
+ * into the ".w60x_dlog" section, which the platform linker scripts keep in
+ * the ELF file only, and the record sent over the console UART holds its
+ * offset in that section plus the raw 32-bit arguments:
+ *
+ *   0x1F <nargs> <id:4> <arg:4>... <xor of all bytes after 0x1F>
+ *
+ * The "w60x_dlog" monitor filter of the platform decodes the records with
+ * the ELF from $BUILD_DIR. Plain text output may be mixed with records.
+ *
+ * Arguments are passed as 32-bit words: integers, characters and pointers
+ * are supported, %s is resolved by the decoder for strings in the
+ * firmware image. 64-bit integers and floating point values are not.
+ * Only built with "board_build.dlog = yes", which also defines
+ * W60X_DLOG_ENABLED.
+ */
+#ifndef W60X_DLOG_H
+#define W60X_DLOG_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define W60X_DLOG_SYNC 0x1F
+#define W60X_DLOG_MAX_ARGS 8
+
+#define W60X_DLOG_NARGS(...) \
+    W60X_DLOG_NARGS_(0, ##__VA_ARGS__, 8, 7, 6, 5, 4, 3, 2, 1, 0)
+#define W60X_DLOG_NARGS_(_0, _1, _2, _3, _4, _5, _6, _7, _8, n, ...) n
+
+#define W60X_DLOG(fmt, ...) do { \
+        static const char _w60x_dlog_fmt[] \
+            __attribute__((section(".w60x_dlog"), used)) = fmt; \
+        w60x_dlog_write((unsigned int)_w60x_dlog_fmt, \
+                        W60X_DLOG_NARGS(__VA_ARGS__), ##__VA_ARGS__); \
+    } while (0)
+
+/* encode and send one record, use W60X_DLOG() instead */
+void w60x_dlog_write(unsigned int id, unsigned int nargs, ...);
+
+/* write a complete record; weak, override to use another transport */
+void w60x_dlog_output(const unsigned char *buf, unsigned int len);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif /* W60X_DLOG_H */
@@ -0,0 +1,23 @@
+/*
+ * lwIP compiler/platform abstraction for host (native) builds of the SDK.
+ * Shadows Src/Network/lwip2.0.3/include/arch/cc.h of the SDK.
+ */
+#ifndef W60X_NATIVE_ARCH_CC_H
+#define W60X_NATIVE_ARCH_CC_H
+
+#include <stdio.h>
+#include <stdlib.h>
+
+#define LWIP_NO_STDINT_H 0
+#define LWIP_NO_INTTYPES_H 0
+
+#define LWIP_RAND() ((u32_t)rand())
+
+#define LWIP_PLATFORM_DIAG(x) do { printf x; } while (0)
+#define LWIP_PLATFORM_ASSERT(x) do { \
+        fprintf(stderr, "lwIP assertion \"%s\" failed at %s:%d\n", \
+                x, __FILE__, __LINE__); \
+        abort(); \
+    } while (0)
+
+#endif /* W60X_NATIVE_ARCH_CC_H */
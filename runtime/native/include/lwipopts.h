@@ -0,0 +1,35 @@
+/*
+ * lwIP options for host (native) builds of the SDK: no OS, only the raw
+ * API and a loopback interface, so protocol code can be unit tested and
+ * benchmarked on the build machine.
+ */
+#ifndef W60X_NATIVE_LWIPOPTS_H
+#define W60X_NATIVE_LWIPOPTS_H
+
+#define NO_SYS                      1
+#define SYS_LIGHTWEIGHT_PROT        0
+#define LWIP_NETCONN                0
+#define LWIP_SOCKET                 0
+
+#define MEM_LIBC_MALLOC             1
+#define MEMP_MEM_MALLOC             1
+#define MEM_ALIGNMENT               8
+
+#define LWIP_IPV4                   1
+#define LWIP_IPV6                   0
+#define LWIP_TCP                    1
+#define LWIP_UDP                    1
+#define LWIP_DHCP                   0
+#define LWIP_DNS                    0
+
+#define LWIP_NETIF_LOOPBACK         1
+#define LWIP_HAVE_LOOPIF            1
+#define LWIP_LOOPBACK_MAX_PBUFS     0
+
+#define TCP_MSS                     1460
+#define TCP_WND                     (8 * TCP_MSS)
+#define TCP_SND_BUF                 (8 * TCP_MSS)
+
+#define LWIP_STATS                  0
+
+#endif /* W60X_NATIVE_LWIPOPTS_H */
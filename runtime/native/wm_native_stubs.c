@@ -0,0 +1,39 @@
+/*
+ * Replacements for the W60x driver and OS services used by the portable
+ * SDK layers in host (native) builds.
+ */
+#include <stdlib.h>
+#include <time.h>
+
+#include "lwip/arch.h"
+
+/* elapsed time, clock() would stall the lwIP timers while the process
+ * sleeps or waits for I/O */
+u32_t sys_now(void)
+{
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (u32_t)((unsigned long long)ts.tv_sec * 1000 +
+                   ts.tv_nsec / 1000000);
+}
+
+void *tls_mem_alloc(unsigned int size)
+{
+    return malloc(size);
+}
+
+void *tls_mem_calloc(unsigned int length, unsigned int size)
+{
+    return calloc(length, size);
+}
+
+void *tls_mem_realloc(void *mem, unsigned int size)
+{
+    return realloc(mem, size);
+}
+
+void tls_mem_free(void *mem)
+{
+    free(mem);
+}
@@ -0,0 +1,179 @@
+#include <string.h>
+
+#include "w60x_ota_delta.h"
+
+#define PATCH_VERSION 1
+#define PATCH_HEAD_LEN 28
+#define OP_END 0
+#define OP_COPY 1
+#define OP_INSERT 2
+#define COPY_CHUNK 512
+
+enum {
+    STATE_HEAD,
+    STATE_IMAGE_HEAD,
+    STATE_OP,
+    STATE_COPY_ARGS,
+    STATE_INSERT_ARGS,
+    STATE_INSERT_DATA,
+    STATE_DONE
+};
+
+static unsigned int get_u32(const unsigned char *buf)
+{
+    return buf[0] | (buf[1] << 8) | (buf[2] << 16) |
+           ((unsigned int)buf[3] << 24);
+}
+
+unsigned int w60x_ota_delta_crc32(unsigned int crc,
+                                  const unsigned char *data,
+                                  unsigned int len)
+{
+    unsigned int i;
+    int bit;
+
+    crc = ~crc;
+    for (i = 0; i < len; i++) {
+        crc ^= data[i];
+        for (bit = 0; bit < 8; bit++)
+            crc = (crc >> 1) ^ (0xEDB88320 & (0 - (crc & 1)));
+    }
+    return ~crc;
+}
+
+static int emit(struct w60x_ota_delta *ctx, const unsigned char *data,
+                unsigned int len, int payload)
+{
+    if (payload) {
+        if (ctx->written + len > ctx->target_size)
+            return W60X_OTA_DELTA_ERR_RANGE;
+        ctx->crc = w60x_ota_delta_crc32(ctx->crc, data, len);
+        ctx->written += len;
+    }
+    return ctx->sink(ctx->arg, data, len) ? W60X_OTA_DELTA_ERR_SINK :
+           W60X_OTA_DELTA_OK;
+}
+
+static int copy_base(struct w60x_ota_delta *ctx, unsigned int offset,
+                     unsigned int length)
+{
+    unsigned int n;
+    int ret;
+
+    if (offset > ctx->base_size || length > ctx->base_size - offset)
+        return W60X_OTA_DELTA_ERR_RANGE;
+    while (length) {
+        n = length < COPY_CHUNK ? length : COPY_CHUNK;
+        ret = emit(ctx, ctx->base + offset, n, 1);
+        if (ret)
+            return ret;
+        offset += n;
+        length -= n;
+    }
+    return W60X_OTA_DELTA_OK;
+}
+
+static int parse_head(struct w60x_ota_delta *ctx)
+{
+    if (memcmp(ctx->buf, "W6DP", 4) || get_u32(ctx->buf + 4) != PATCH_VERSION)
+        return W60X_OTA_DELTA_ERR_FORMAT;
+    ctx->base_size = get_u32(ctx->buf + 8);
+    if (w60x_ota_delta_crc32(0, ctx->base, ctx->base_size) !=
+            get_u32(ctx->buf + 12))
+        return W60X_OTA_DELTA_ERR_BASE;
+    ctx->target_size = get_u32(ctx->buf + 16);
+    ctx->target_crc = get_u32(ctx->buf + 20);
+    ctx->remaining = get_u32(ctx->buf + 24);
+    ctx->state = STATE_IMAGE_HEAD;
+    return W60X_OTA_DELTA_OK;
+}
+
+static int run_op(struct w60x_ota_delta *ctx)
+{
+    switch (ctx->state) {
+    case STATE_OP:
+        if (ctx->buf[0] == OP_END) {
+            ctx->state = STATE_DONE;
+        } else if (ctx->buf[0] == OP_COPY) {
+            ctx->state = STATE_COPY_ARGS;
+            ctx->need = 8;
+        } else if (ctx->buf[0] == OP_INSERT) {
+            ctx->state = STATE_INSERT_ARGS;
+            ctx->need = 4;
+        } else {
+            return W60X_OTA_DELTA_ERR_FORMAT;
+        }
+        return W60X_OTA_DELTA_OK;
+    case STATE_COPY_ARGS:
+        ctx->state = STATE_OP;
+        ctx->need = 1;
+        return copy_base(ctx, get_u32(ctx->buf), get_u32(ctx->buf + 4));
+    case STATE_INSERT_ARGS:
+        ctx->remaining = get_u32(ctx->buf);
+        ctx->state = ctx->remaining ? STATE_INSERT_DATA : STATE_OP;
+        ctx->need = 1;
+        return W60X_OTA_DELTA_OK;
+    default:
+        return parse_head(ctx);
+    }
+}
+
+void w60x_ota_delta_begin(struct w60x_ota_delta *ctx,
+                          const unsigned char *base,
+                          w60x_ota_delta_sink sink, void *arg)
+{
+    memset(ctx, 0, sizeof(*ctx));
+    ctx->base = base;
+    ctx->sink = sink;
+    ctx->arg = arg;
+    ctx->state = STATE_HEAD;
+    ctx->need = PATCH_HEAD_LEN;
+}
+
+int w60x_ota_delta_feed(struct w60x_ota_delta *ctx,
+                        const unsigned char *data, unsigned int len)
+{
+    unsigned int n;
+
+    while (len && !ctx->error) {
+        if (ctx->state == STATE_DONE) {
+            ctx->error = W60X_OTA_DELTA_ERR_FORMAT;
+        } else if (ctx->state == STATE_IMAGE_HEAD ||
+                   ctx->state == STATE_INSERT_DATA) {
+            /* streamed straight through to the sink */
+            n = len < ctx->remaining ? len : ctx->remaining;
+            ctx->error = emit(ctx, data, n,
+                              ctx->state == STATE_INSERT_DATA);
+            data += n;
+            len -= n;
+            ctx->remaining -= n;
+            if (!ctx->remaining) {
+                ctx->state = STATE_OP;
+                ctx->need = 1;
+            }
+        } else {
+            n = ctx->need - ctx->buf_len;
+            n = len < n ? len : n;
+            memcpy(ctx->buf + ctx->buf_len, data, n);
+            ctx->buf_len += n;
+            data += n;
+            len -= n;
+            if (ctx->buf_len == ctx->need) {
+                ctx->buf_len = 0;
+                ctx->error = run_op(ctx);
+            }
+        }
+    }
+    return ctx->error;
+}
+
+int w60x_ota_delta_finish(struct w60x_ota_delta *ctx)
+{
+    if (ctx->error)
+        return ctx->error;
+    if (ctx->state != STATE_DONE)
+        return W60X_OTA_DELTA_ERR_FORMAT;
+    if (ctx->written != ctx->target_size || ctx->crc != ctx->target_crc)
+        return W60X_OTA_DELTA_ERR_TARGET;
+    return W60X_OTA_DELTA_OK;
+}
@@ -0,0 +1,76 @@
+/*
+ * Streaming patch applier for delta OTA updates ("ota-delta" target).
+ *
+ * The patch is consumed while it is downloaded, it never has to be stored:
+ * unchanged parts are copied from the running image (memory mapped flash),
+ * the reconstructed OTA image (header + firmware) is passed to a sink,
+ * usually the SDK firmware update API:
+ *
+ *   static int fwup_sink(void *arg, const unsigned char *data,
+ *                        unsigned int len)
+ *   {
+ *       return tls_fwup_request_sync(*(u32 *)arg, (u8 *)data, len);
+ *   }
+ *
+ *   w60x_ota_delta_begin(&ctx, (const unsigned char *)W60X_FLASH_APP_ADDR
+ *                        + 0x100, fwup_sink, &session);
+ *   for each received chunk: w60x_ota_delta_feed(&ctx, chunk, len);
+ *   w60x_ota_delta_finish(&ctx);
+ *
+ * The base CRC is checked before anything is written, so a patch made for
+ * another release is rejected.
+ */
+#ifndef W60X_OTA_DELTA_H
+#define W60X_OTA_DELTA_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define W60X_OTA_DELTA_OK 0
+#define W60X_OTA_DELTA_ERR_FORMAT -1
+#define W60X_OTA_DELTA_ERR_BASE -2
+#define W60X_OTA_DELTA_ERR_RANGE -3
+#define W60X_OTA_DELTA_ERR_SINK -4
+#define W60X_OTA_DELTA_ERR_TARGET -5
+
+/* returns 0 on success */
+typedef int (*w60x_ota_delta_sink)(void *arg, const unsigned char *data,
+                                   unsigned int len);
+
+struct w60x_ota_delta {
+    const unsigned char *base;
+    w60x_ota_delta_sink sink;
+    void *arg;
+    int state;
+    int error;
+    unsigned char buf[28];
+    unsigned int buf_len;
+    unsigned int need;
+    unsigned int remaining;
+    unsigned int base_size;
+    unsigned int target_size;
+    unsigned int target_crc;
+    unsigned int written;
+    unsigned int crc;
+};
+
+void w60x_ota_delta_begin(struct w60x_ota_delta *ctx,
+                          const unsigned char *base,
+                          w60x_ota_delta_sink sink, void *arg);
+/* returns W60X_OTA_DELTA_OK or the first error */
+int w60x_ota_delta_feed(struct w60x_ota_delta *ctx,
+                        const unsigned char *data, unsigned int len);
+/* checks the patch is complete and the result matches its CRC */
+int w60x_ota_delta_finish(struct w60x_ota_delta *ctx);
+
+/* standard CRC-32 (as zlib), start with crc = 0 */
+unsigned int w60x_ota_delta_crc32(unsigned int crc,
+                                  const unsigned char *data,
+                                  unsigned int len);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif /* W60X_OTA_DELTA_H */